@@ -0,0 +1,204 @@
+# coding: utf-8
+
+# Benchmark the segment intersection engines of poly_point_isect
+# on synthetic segment sets and on the edges of layout json files (output of tlp2myjson.convert).
+# Every engine is checked against the brute force isect_segments__naive (same points and number of crossing pairs),
+# the exit status is 1 if any engine differs.  The sweep-line engines are known to differ from it on the degenerate
+# segments (shared end points, collinear overlaps), so the differences there are only reported unless
+# --check_degenerate is given.
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+import poly_point_isect
+
+ENGINES = {
+    'sweep-rbtree': {'engine': 'sweep', 'queue_type': 'rbtree', 'status_type': 'rbtree'},
+    'sweep-heap': {'engine': 'sweep', 'queue_type': 'heap', 'status_type': 'rbtree'},
+    'sweep-list': {'engine': 'sweep', 'queue_type': 'heap', 'status_type': 'list'},
+    'sweep-list-native': {'engine': 'sweep', 'queue_type': 'heap', 'status_type': 'list', 'number_type': 'native'},
+    'grid': {'engine': 'grid'},
+    'tiled': {'engine': 'tiled'},
+}
+
+
+# Segments with both end points uniformly distributed, so many long segments and crossings
+def random_segments(n, rng):
+    return [((rng.random(), rng.random()), (rng.random(), rng.random())) for _ in range(n)]
+
+
+# Short segments around uniformly distributed points, like the edges of a node-link layout
+def short_segments(n, rng, length=None):
+    if length is None:
+        length = 2.0 / n ** 0.5
+    segments = []
+    for _ in range(n):
+        x, y = rng.random(), rng.random()
+        segments.append(((x, y), (x + (rng.random() - 0.5) * length, y + (rng.random() - 0.5) * length)))
+    return segments
+
+
+# Edges of a jittered grid graph, with diagonals so there are crossings
+def grid_segments(n, rng, jitter=0.1):
+    size = max(2, int((n / 4) ** 0.5))
+    points = {(i, j): (i + rng.uniform(-jitter, jitter), j + rng.uniform(-jitter, jitter))
+              for i in range(size) for j in range(size)}
+    segments = []
+    for i in range(size - 1):
+        for j in range(size - 1):
+            segments.append((points[(i, j)], points[(i + 1, j)]))
+            segments.append((points[(i, j)], points[(i, j + 1)]))
+            segments.append((points[(i, j)], points[(i + 1, j + 1)]))
+            segments.append((points[(i + 1, j)], points[(i, j + 1)]))
+    return segments[:n]
+
+
+# Segments on a small integer lattice: vertical segments, shared end points and collinear overlaps
+def degenerate_segments(n, rng, size=10):
+    segments = []
+    while len(segments) < n:
+        x0, y0 = rng.randint(0, size), rng.randint(0, size)
+        kind = rng.randint(0, 3)
+        if kind == 0:
+            # vertical
+            segments.append(((x0, y0), (x0, rng.randint(0, size))))
+        elif kind == 1 and segments:
+            # share an end point with an existing segment
+            segments.append((rng.choice(segments)[rng.randint(0, 1)], (x0, y0)))
+        elif kind == 2 and segments:
+            # collinear with an existing segment, overlapping it
+            (ax, ay), (bx, by) = rng.choice(segments)
+            t = rng.choice([-1, 2])
+            segments.append(((ax + (bx - ax) / 2.0, ay + (by - ay) / 2.0), (ax + (bx - ax) * t, ay + (by - ay) * t)))
+        else:
+            segments.append(((x0, y0), (rng.randint(0, size), rng.randint(0, size))))
+    return segments
+
+
+GENERATORS = {
+    'random': random_segments,
+    'short': short_segments,
+    'grid': grid_segments,
+    'degenerate': degenerate_segments,
+}
+
+# Generators whose differences from the naive version do not change the exit status by default
+REPORT_ONLY_GENERATORS = ['degenerate']
+
+
+# Edge segments of a layout json file, the edges are GeoJSON-like line strings
+def load_layout_segments(path):
+    layout = json.load(open(path))
+    segments = [tuple(tuple(c) for c in e['geometry']['coordinates'][:2]) for e in layout['edges']]
+    return segments, layout.get('bounding_box')
+
+
+def _point_key(p, digits=6):
+    return round(float(p[0]), digits), round(float(p[1]), digits)
+
+
+# Run one engine and return (seconds, peak memory in bytes, number of crossing pairs, set of points).
+# Tracing memory slows down the pure Python engines a lot, so the memory is measured in a second run.
+def run_engine(segments, options, measure_memory=True):
+    start = time.perf_counter()
+    xy, i, _ = poly_point_isect.isect_segments_include_indices(segments, **options)
+    seconds = time.perf_counter() - start
+
+    peak = None
+    if measure_memory:
+        tracemalloc.start()
+        poly_point_isect.isect_segments_include_indices(segments, **options)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return seconds, peak, len(i), set(_point_key(p) for p in xy.tolist())
+
+
+# Return (seconds, number of crossing pairs, set of points), the naive version gives one point per pair
+def run_naive(segments):
+    start = time.perf_counter()
+    points = poly_point_isect.isect_segments__naive(segments)
+    seconds = time.perf_counter() - start
+    return seconds, len(points), set(_point_key(p) for p in points)
+
+
+def benchmark(name, segments, engines, naive_max, measure_memory=True, bounding_box=None):
+    print('{} (#segments: {})'.format(name, len(segments)))
+    reference = None
+    if len(segments) <= naive_max:
+        seconds, reference_count, reference = run_naive(segments)
+        print('    {:<20} {:>10.3f}s {:>12} {:>10}'.format('naive', seconds, '', reference_count))
+
+    mismatches = []
+    for engine in engines:
+        options = dict(ENGINES[engine])
+        if bounding_box is not None and options['engine'] == 'grid':
+            options['bounding_box'] = bounding_box
+        seconds, peak, count, points = run_engine(segments, options, measure_memory)
+        flag = ''
+        if reference is not None and (points != reference or count != reference_count):
+            flag = 'MISMATCH (missing {} points, extra {} points, {:+d} pairs)'.format(
+                len(reference - points), len(points - reference), count - reference_count)
+            mismatches.append(engine)
+        memory = '' if peak is None else '{:.1f}MB'.format(peak / 1e6)
+        print('    {:<20} {:>10.3f}s {:>12} {:>10} {}'.format(engine, seconds, memory, count, flag))
+    return mismatches
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default=[1000, 10000], type=int, nargs='+')
+    parser.add_argument('--generators', default=list(GENERATORS.keys()), choices=GENERATORS.keys(), nargs='+')
+    parser.add_argument('--engines', default=list(ENGINES.keys()), choices=ENGINES.keys(), nargs='+')
+    parser.add_argument('--layouts', default=[], nargs='*', help='layout json files or directories of them')
+    parser.add_argument('--naive_max', default=2000, type=int,
+                        help='only check against the O(n^2) naive version up to this number of segments')
+    parser.add_argument('--skip_memory', default=False, action='store_true',
+                        help='do not run every engine a second time to trace its peak memory')
+    parser.add_argument('--seed', default=0, type=int)
+    parser.add_argument('--check_degenerate', default=False, action='store_true',
+                        help='also exit with 1 when an engine differs from the naive version on the {} segments'
+                        .format(', '.join(REPORT_ONLY_GENERATORS)))
+
+    args = parser.parse_args()
+    print(args)
+    print('Memory is traced in this process only, not in the worker processes of the tiled engine.')
+
+    mismatches = []
+    reported = []
+    for g in args.generators:
+        for n in args.sizes:
+            segments = GENERATORS[g](n, random.Random(args.seed))
+            found = ['{}-{}: {}'.format(g, n, e)
+                     for e in benchmark('{}-{}'.format(g, n), segments, args.engines, args.naive_max,
+                                        not args.skip_memory)]
+            if g in REPORT_ONLY_GENERATORS and not args.check_degenerate:
+                reported += found
+            else:
+                mismatches += found
+
+    layout_files = []
+    for path in args.layouts:
+        if os.path.isdir(path):
+            layout_files += sorted(os.path.join(path, f) for f in os.listdir(path) if f.endswith('.json'))
+        else:
+            layout_files.append(path)
+    for path in layout_files:
+        segments, bounding_box = load_layout_segments(path)
+        mismatches += ['{}: {}'.format(path, e)
+                       for e in benchmark(path, segments, args.engines, args.naive_max,
+                                      not args.skip_memory, bounding_box)]
+
+    if reported:
+        print('Engines differing from the naive version on degenerate segments (see --check_degenerate):')
+        for m in reported:
+            print('    ' + m)
+    if mismatches:
+        print('Engines differing from the naive version:')
+        for m in mismatches:
+            print('    ' + m)
+        sys.exit(1)
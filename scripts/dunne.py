@@ -0,0 +1,42 @@
+# coding: utf-8
+
+# Readability metrics of Dunne et al. used for comparison with the SA metrics (dunne_ratio in the result json).
+# They are computed from the overlapping pairs, overlap areas and crossing angles of the SA computation, so enabling
+# them does not repeat any geometry.  All ratios are in [0, 1], 1 is the most readable.
+
+import math
+
+import numpy as np
+
+# The ideal crossing angle of Dunne et al.
+IDEAL_CROSSING_ANGLE = math.radians(70)
+
+
+# Node occlusion: 1 - the overlapping area of the nodes relative to their total area, for the leaf nodes only since
+# the metric does not know about a node hierarchy.  The overlapping area is the sum of the pairwise overlap areas,
+# so an area covered by three nodes counts three times; the ratio is clipped at 0.
+def node_occlusion_ratio(overlap_areas, node_areas):
+    total = float(np.sum(node_areas))
+    if total <= 0:
+        return 1.0
+    return max(0.0, 1.0 - float(np.sum(overlap_areas)) / total)
+
+
+# Edge crossing angle: 1 - the average deviation of the crossing angles (in radians, in [0, pi/2]) from the ideal
+# angle, relative to the ideal angle.  1 without any crossing.
+def crossing_angle_ratio(angles, ideal=IDEAL_CROSSING_ANGLE):
+    angles = np.asarray(angles, dtype=float)
+    if len(angles) == 0:
+        return 1.0
+    return 1.0 - float(np.abs(ideal - angles).sum()) / (len(angles) * ideal)
+
+
+# The Dunne ratios of the nn and ee families from the arrays shared with the SA metrics: the NN pairs (K, 2) and
+# their overlap areas, the areas of all nodes, the mask of the leaf nodes (without the removed ones) and the
+# crossing angles of the EE pairs.  Without overlap areas (count-only computation) there is no nn ratio.
+def dunne_ratios(nn_pairs, nn_areas, node_areas, is_leaf, angles):
+    ratios = {'ee': crossing_angle_ratio(angles)}
+    if nn_areas is not None:
+        leaf_pair = is_leaf[nn_pairs[:, 0]] & is_leaf[nn_pairs[:, 1]]
+        ratios['nn'] = node_occlusion_ratio(nn_areas[leaf_pair], node_areas[is_leaf])
+    return ratios
@@ -1,5 +1,7 @@
 import math
+import numpy as np
 from shapely.geometry import *
+from shapely.geometry.base import BaseGeometry
 
 EPSILON = 1e-6
 
@@ -34,6 +36,22 @@ def get_angle_between_line_segments_v2(l1, l2):
     return math.acos(cos_val)
 
 
+# Batch version of get_angle_between_line_segments_v2.
+# l1 and l2 are (N,2,2) arrays of line segments: l1[i] and l2[i] are the two segments of the i-th crossing pair.
+# Return an array of the N angles.
+def get_angles_between_line_segments(l1, l2):
+    l1 = np.asarray(l1, dtype=float)
+    l2 = np.asarray(l2, dtype=float)
+    vec1 = l1[:, 1] - l1[:, 0]
+    vec2 = l2[:, 1] - l2[:, 0]
+    len1 = np.sqrt(vec1[:, 0] ** 2 + vec1[:, 1] ** 2)
+    len2 = np.sqrt(vec2[:, 0] ** 2 + vec2[:, 1] ** 2)
+    cos_val = np.abs(vec1[:, 0] * vec2[:, 0] + vec1[:, 1] * vec2[:, 1]) / (len1 * len2)
+    # Clamp cos_val to [0,1] (this happens b/c floating operation error)
+    cos_val = np.clip(cos_val, 0, 1)
+    return np.arccos(cos_val)
+
+
 # Get the "main" axis line of a geometry
 def get_main_axis(geom):
     if geom.geom_type == 'LineString':
@@ -46,3 +64,346 @@ def get_main_axis(geom):
         return LineString([coords[0], coords[1]])
     else:
         return LineString([coords[1], coords[2]])
+
+
+# Get the coordinates of a geometry, which is either a Shapely object, a GeoJSON-like mapping
+# (as stored in the layout json) or a plain list of coordinates
+def _get_coords(geom):
+    if hasattr(geom, 'exterior'):
+        return geom.exterior.coords
+    if hasattr(geom, 'coords'):
+        return geom.coords
+    if isinstance(geom, dict):
+        if geom['type'] == 'Polygon':
+            return geom['coordinates'][0]
+        return geom['coordinates']
+    return geom
+
+
+# Leaf nodes are circles.  Get the center and radius of a leaf node from its 'center' field (written by tlp2myjson)
+# or, for older layout files, from the bounds of its buffered polygon.
+def get_node_circle(node):
+    r = node['diameter'] / 2.0
+    if node.get('center') is not None:
+        return node['center'][0], node['center'][1], r
+    coords = np.asarray(_get_coords(node['geometry']), dtype=float)
+    return (coords[:, 0].min() + coords[:, 0].max()) / 2.0, (coords[:, 1].min() + coords[:, 1].max()) / 2.0, r
+
+
+# Return an (N,2) array of centers and an array of N radii of the given leaf nodes
+def get_node_circles(nodes):
+    circles = np.array([get_node_circle(n) for n in nodes], dtype=float).reshape(-1, 3)
+    return circles[:, :2], circles[:, 2]
+
+
+# Overlap (lens) areas of pairs of circles in closed form, instead of intersecting two buffered polygons.
+# c1 and c2 are (N,2) arrays of centers, r1 and r2 arrays of N radii: the i-th pair is circle (c1[i], r1[i])
+# and circle (c2[i], r2[i]).  Return an array of the N areas.
+def get_circle_overlap_areas(c1, r1, c2, r2):
+    c1 = np.asarray(c1, dtype=float).reshape(-1, 2)
+    c2 = np.asarray(c2, dtype=float).reshape(-1, 2)
+    r1 = np.broadcast_to(np.asarray(r1, dtype=float), len(c1))
+    r2 = np.broadcast_to(np.asarray(r2, dtype=float), len(c2))
+    d = np.sqrt(((c1 - c2) ** 2).sum(axis=1))
+
+    areas = np.zeros(len(d))
+    # one circle inside the other
+    inside = d <= np.abs(r1 - r2)
+    areas[inside] = math.pi * np.minimum(r1, r2)[inside] ** 2
+    # the two circles cross each other
+    lens = ~inside & (d < r1 + r2)
+    d, r1, r2 = d[lens], r1[lens], r2[lens]
+    cos1 = np.clip((d ** 2 + r1 ** 2 - r2 ** 2) / (2 * d * r1), -1, 1)
+    cos2 = np.clip((d ** 2 + r2 ** 2 - r1 ** 2) / (2 * d * r2), -1, 1)
+    kite = (-d + r1 + r2) * (d + r1 - r2) * (d - r1 + r2) * (d + r1 + r2)
+    areas[lens] = r1 ** 2 * np.arccos(cos1) + r2 ** 2 * np.arccos(cos2) - 0.5 * np.sqrt(np.maximum(kite, 0))
+    return areas
+
+
+# Lengths of the parts of line segments inside circles in closed form.
+# c is an (N,2) array of centers, r an array of N radii and segments an (N,2,2) array of line segments:
+# the i-th pair is circle (c[i], r[i]) and segments[i].  Return an array of the N lengths.
+def get_circle_segment_overlap_lengths(c, r, segments):
+    c = np.asarray(c, dtype=float).reshape(-1, 2)
+    segments = np.asarray(segments, dtype=float).reshape(-1, 2, 2)
+    r = np.broadcast_to(np.asarray(r, dtype=float), len(c))
+    p0 = segments[:, 0] - c
+    v = segments[:, 1] - segments[:, 0]
+
+    # the points p0 + t * v on the circle: a * t^2 + b * t + cc = 0
+    a = (v ** 2).sum(axis=1)
+    b = 2 * (v * p0).sum(axis=1)
+    cc = (p0 ** 2).sum(axis=1) - r ** 2
+    disc = b ** 2 - 4 * a * cc
+
+    lengths = np.zeros(len(c))
+    # zero-length segments (e.g. the dummy segments of overlapping nodes) are skipped
+    crossing = (disc > 0) & (a > 0)
+    a, b, sqrt_disc = a[crossing], b[crossing], np.sqrt(disc[crossing])
+    t0 = np.clip((-b - sqrt_disc) / (2 * a), 0, 1)
+    t1 = np.clip((-b + sqrt_disc) / (2 * a), 0, 1)
+    lengths[crossing] = (t1 - t0) * np.sqrt(a)
+    return lengths
+
+
+# Axis-aligned bounding boxes of geometries (Shapely objects, GeoJSON-like mappings or coordinate lists)
+# as an (N,4) array of [min_x, min_y, max_x, max_y]
+def get_bounds(geoms):
+    if _all_shapely(geoms):
+        return shapely.bounds(get_geometry_array(geoms)).reshape(-1, 4)
+    bounds = np.zeros((len(geoms), 4))
+    for i, g in enumerate(geoms):
+        if hasattr(g, 'bounds'):
+            bounds[i] = g.bounds
+        else:
+            coords = np.asarray(_get_coords(g), dtype=float).reshape(-1, 2)
+            bounds[i, :2] = coords.min(axis=0)
+            bounds[i, 2:] = coords.max(axis=0)
+    return bounds
+
+
+# Bounding boxes of nodes: from the circle of a leaf node when available, otherwise from its geometry
+def get_node_bounds(nodes):
+    bounds = np.zeros((len(nodes), 4))
+    polygons = []
+    for i, n in enumerate(nodes):
+        if n.get('center') is not None:
+            r = n['diameter'] / 2.0
+            bounds[i] = n['center'][0] - r, n['center'][1] - r, n['center'][0] + r, n['center'][1] + r
+        else:
+            polygons.append(i)
+    if polygons:
+        bounds[polygons] = get_bounds([nodes[i]['geometry'] for i in polygons])
+    return bounds
+
+
+# For each k, all the pairs (k, j) with starts[k] <= j < ends[k], as two index arrays
+def _expand_ranges(starts, ends):
+    counts = np.maximum(ends - starts, 0)
+    rows = np.repeat(np.arange(len(starts)), counts)
+    cols = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(starts, counts)
+    return rows, cols
+
+
+def _y_overlap(bounds_a, bounds_b, i, j):
+    return (bounds_a[i, 1] <= bounds_b[j, 3]) & (bounds_b[j, 1] <= bounds_a[i, 3])
+
+
+# Pairs of overlapping bounding boxes by a sweep over the x axis, without any spatial index object.
+# Two x intervals overlap iff the left end of one of them lies in the other one, so after sorting by the left ends
+# the pairs are contiguous ranges found by binary search.  Only the x-overlapping pairs are materialized.
+# With bounds_b None, return the pairs (i, j) within bounds_a, otherwise the pairs (i in a, j in b).
+def _sweep_x(bounds_a, bounds_b=None):
+    order_a = np.argsort(bounds_a[:, 0], kind='stable')
+    min_a = bounds_a[order_a, 0]
+    if bounds_b is None:
+        # every box after k in the sorted order whose left end is not beyond the right end of k
+        ends = np.searchsorted(min_a, bounds_a[order_a, 2], side='right')
+        rows, cols = _expand_ranges(np.arange(1, len(order_a) + 1), ends)
+        i, j = order_a[rows], order_a[cols]
+        keep = _y_overlap(bounds_a, bounds_a, i, j)
+        return i[keep], j[keep]
+
+    order_b = np.argsort(bounds_b[:, 0], kind='stable')
+    min_b = bounds_b[order_b, 0]
+    # the left end of a box of a in [min_x, max_x] of a box of b
+    rows, cols = _expand_ranges(np.searchsorted(min_a, bounds_b[:, 0], side='left'),
+                                np.searchsorted(min_a, bounds_b[:, 2], side='right'))
+    j1, i1 = rows, order_a[cols]
+    # the left end of a box of b in (min_x, max_x] of a box of a, strictly after so no pair is found twice
+    rows, cols = _expand_ranges(np.searchsorted(min_b, bounds_a[:, 0], side='right'),
+                                np.searchsorted(min_b, bounds_a[:, 2], side='right'))
+    i2, j2 = rows, order_b[cols]
+    i, j = np.concatenate([i1, i2]), np.concatenate([j1, j2])
+    keep = _y_overlap(bounds_a, bounds_b, i, j)
+    return i[keep], j[keep]
+
+
+# The boxes of every horizontal strip, as lists of indices
+def _strip_members(bounds, y0, height, num_strips):
+    lo = np.clip(((bounds[:, 1] - y0) // height).astype(np.int64), 0, num_strips - 1)
+    hi = np.clip(((bounds[:, 3] - y0) // height).astype(np.int64), 0, num_strips - 1)
+    box, k = _expand_ranges(lo, hi + 1)
+    order = np.argsort(k, kind='stable')
+    box, k = box[order], k[order]
+    splits = np.searchsorted(k, np.arange(1, num_strips))
+    return np.split(box, splits)
+
+
+# The x sweep alone materializes every x-overlapping pair, which is quadratic for large layouts, so the plane is
+# cut into horizontal strips about twice as high as a typical box and the sweep runs in every strip.
+# A pair is only reported by the strip containing the bottom of the overlap of its two boxes.
+def _candidate_pairs_sweep(bounds_a, bounds_b=None):
+    all_bounds = bounds_a if bounds_b is None else np.concatenate([bounds_a, bounds_b])
+    n = len(all_bounds)
+    if n == 0 or (bounds_b is not None and (len(bounds_a) == 0 or len(bounds_b) == 0)):
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    y0 = all_bounds[:, 1].min()
+    extent = all_bounds[:, 3].max() - y0
+    height = 2 * np.median(all_bounds[:, 3] - all_bounds[:, 1])
+    num_strips = 1
+    if extent > 0 and height > 0:
+        num_strips = int(min(np.ceil(extent / height), max(1, np.sqrt(n))))
+    height = extent / num_strips if extent > 0 else 1.0
+
+    same = bounds_b is None
+    if same:
+        bounds_b = bounds_a
+    members_a = _strip_members(bounds_a, y0, height, num_strips)
+    members_b = members_a if same else _strip_members(bounds_b, y0, height, num_strips)
+
+    result_i, result_j = [], []
+    for k in range(num_strips):
+        ma, mb = members_a[k], members_b[k]
+        if len(ma) == 0 or len(mb) == 0:
+            continue
+        if same:
+            i, j = _sweep_x(bounds_a[ma])
+            i, j = ma[i], ma[j]
+        else:
+            i, j = _sweep_x(bounds_a[ma], bounds_b[mb])
+            i, j = ma[i], mb[j]
+        bottom = np.maximum(bounds_a[i, 1], bounds_b[j, 1])
+        keep = np.clip(((bottom - y0) // height).astype(np.int64), 0, num_strips - 1) == k
+        result_i.append(i[keep])
+        result_j.append(j[keep])
+    if not result_i:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    i, j = np.concatenate(result_i), np.concatenate(result_j)
+    if same:
+        return np.minimum(i, j), np.maximum(i, j)
+    return i, j
+
+
+def _candidate_pairs_strtree(bounds_a, bounds_b=None):
+    import shapely
+    boxes_a = shapely.box(*bounds_a.T)
+    boxes_b = boxes_a if bounds_b is None else shapely.box(*bounds_b.T)
+    j, i = shapely.STRtree(boxes_a).query(boxes_b)
+    if bounds_b is None:
+        keep = i < j
+        return i[keep], j[keep]
+    return i, j
+
+
+# Pairs of geometries whose bounding boxes overlap (touching counts as overlapping), the candidates for the
+# exact NN / NE / EE geometry.  bounds_a and bounds_b are (N,4) arrays of bounding boxes (see get_bounds).
+# With bounds_b None, return the index arrays (i, j), i < j, of pairs within bounds_a,
+# otherwise the index arrays (i, j) of pairs of bounds_a[i] and bounds_b[j].
+# method is 'sweep' (numpy only) or 'strtree' (Shapely 2.x STRtree); both return the same set of pairs.
+def get_candidate_pairs(bounds_a, bounds_b=None, method='sweep'):
+    bounds_a = np.asarray(bounds_a, dtype=float).reshape(-1, 4)
+    if bounds_b is not None:
+        bounds_b = np.asarray(bounds_b, dtype=float).reshape(-1, 4)
+    if method == 'strtree':
+        return _candidate_pairs_strtree(bounds_a, bounds_b)
+    return _candidate_pairs_sweep(bounds_a, bounds_b)
+
+
+# Candidate pairs of a whole layout from one set of bounding boxes.
+# nodes are the leaf nodes followed by the metanodes, edges the edges of the layout json.
+# Return a dict with the index arrays of the node-node ('nn'), node-edge ('ne') and edge-edge ('ee') candidates.
+# Pairs that are excluded by the node hierarchy (e.g. a node and its ancestors) still have to be removed by the caller.
+def get_layout_candidate_pairs(nodes, edges, method='sweep'):
+    node_bounds = get_node_bounds(nodes)
+    edge_bounds = get_bounds([e['geometry'] for e in edges])
+    return {
+        'nn': get_candidate_pairs(node_bounds, method=method),
+        'ne': get_candidate_pairs(node_bounds, edge_bounds, method=method),
+        'ee': get_candidate_pairs(edge_bounds, method=method),
+    }
+
+
+# Shapely 2.x has vectorized functions over arrays of geometries, Shapely 1.x only per-object methods
+try:
+    import shapely
+    SHAPELY_VECTORIZED = hasattr(shapely, 'intersection') and hasattr(shapely, 'STRtree')
+except ImportError:
+    SHAPELY_VECTORIZED = False
+
+# Number of pairs intersected at once, which bounds the memory of the intermediate intersection geometries
+OVERLAP_BATCH_SIZE = 50000
+
+
+# Convert geometries (Shapely objects or GeoJSON-like mappings as stored in the layout json) to an array of
+# Shapely geometries, so they are built once per layout and shared by all the NN / NE / EE computations
+def get_geometry_array(geoms):
+    arr = np.empty(len(geoms), dtype=object)
+    for k, g in enumerate(geoms):
+        arr[k] = shape(g) if isinstance(g, dict) else g
+    return arr
+
+
+# Whether the vectorized functions of Shapely 2.x apply to all the geometries
+def _all_shapely(geoms):
+    return SHAPELY_VECTORIZED and all(isinstance(g, BaseGeometry) for g in geoms)
+
+
+# The first two points of line geometries as an (N,2,2) array of line segments
+def get_segments(geoms):
+    if _all_shapely(geoms) and len(geoms):
+        coords, index = shapely.get_coordinates(get_geometry_array(geoms), return_index=True)
+        first = np.searchsorted(index, np.arange(len(geoms)))
+        return np.stack([coords[first], coords[first + 1]], axis=1)
+    return np.array([np.asarray(_get_coords(g), dtype=float)[:2, :2] for g in geoms], dtype=float).reshape(-1, 2, 2)
+
+
+# Whether the geometries (Shapely objects, None for no geometry) are valid, see Shapely's is_valid
+def get_valid_flags(geoms):
+    geoms = np.asarray(geoms, dtype=object)
+    valid = np.ones(len(geoms), dtype=bool)
+    given = np.flatnonzero([g is not None for g in geoms])
+    if SHAPELY_VECTORIZED:
+        valid[given] = shapely.is_valid(geoms[given])
+    else:
+        valid[given] = [g.is_valid for g in geoms[given]]
+    return valid
+
+
+def _overlap_measure(geoms_a, geoms_b, i, j, measure):
+    geoms_a = np.asarray(geoms_a, dtype=object)
+    geoms_b = np.asarray(geoms_b, dtype=object)
+    i = np.asarray(i, dtype=np.int64)
+    j = np.asarray(j, dtype=np.int64)
+    values = np.zeros(len(i))
+    if not SHAPELY_VECTORIZED:
+        for k in range(len(i)):
+            a, b = geoms_a[i[k]], geoms_b[j[k]]
+            if measure == 'flag':
+                values[k] = a.intersects(b) and not a.touches(b)
+                continue
+            overlap = a.intersection(b)
+            values[k] = overlap.area if measure == 'area' else overlap.length
+        return values
+
+    # Most candidate pairs only overlap by bounding box: test them with prepared geometries first, which is much
+    # cheaper than building the intersection; the other pairs are 0 either way
+    shapely.prepare(geoms_a)
+    func = shapely.area if measure == 'area' else shapely.length
+    for start in range(0, len(i), OVERLAP_BATCH_SIZE):
+        a = geoms_a[i[start:start + OVERLAP_BATCH_SIZE]]
+        b = geoms_b[j[start:start + OVERLAP_BATCH_SIZE]]
+        hit = np.flatnonzero(shapely.intersects(a, b))
+        if measure == 'flag':
+            values[start + hit] = ~shapely.touches(a[hit], b[hit])
+        else:
+            values[start + hit] = func(shapely.intersection(a[hit], b[hit]))
+    return values
+
+
+# Overlap areas of the candidate pairs (geoms_a[i[k]], geoms_b[j[k]]), e.g. of the NN pairs from
+# get_candidate_pairs with geoms_a = geoms_b = the node geometries.  Return an array of the areas.
+def get_overlap_areas(geoms_a, geoms_b, i, j):
+    return _overlap_measure(geoms_a, geoms_b, i, j, 'area')
+
+
+# Lengths of the parts of line geometries inside (polygon) geometries for the candidate pairs
+# (geoms_a[i[k]], geoms_b[j[k]]), e.g. of the NE pairs with geoms_a the nodes and geoms_b the edges.
+def get_overlap_lengths(geoms_a, geoms_b, i, j):
+    return _overlap_measure(geoms_a, geoms_b, i, j, 'length')
+
+
+# 1 for the candidate pairs (geoms_a[i[k]], geoms_b[j[k]]) whose interiors overlap, 0 otherwise: the pairs counted by
+# the count-based metrics, without building their intersections
+def get_overlap_flags(geoms_a, geoms_b, i, j):
+    return _overlap_measure(geoms_a, geoms_b, i, j, 'flag')
@@ -1,13 +1,17 @@
 # This file runs at "multilevel-metric" environment (Python 2)
 # Expose a method to convert a tlp file to json
-# Require packages: tlp, shapely
+# Require packages: tlp, shapely, numpy
 
 from tulip import tlp
 from shapely.geometry import *
+from multiprocessing import Pool
+import numpy as np
+import argparse
 import re
 import json
-import sys
 import os
+import time
+import traceback
 
 DUMMY_LINE_SEGMENT = LineString([(0, 0), (0, 0)])
 
@@ -32,15 +36,71 @@ def chop_segment(n1, n2):
     return LineString([x1, x2])
 
 
-def convert(input_path, leaf_only=False, bounding_shape='convex_hull'):
+OUTPUT_EXTENSIONS = {'json': ['.json'], 'npz': ['.npz'], 'both': ['.json', '.npz']}
+
+
+# Exterior ring coordinates of a metanode geometry as a (K, 2) array
+def _ring_coords(geom):
+    if geom is None:
+        return np.zeros((0, 2))
+    if hasattr(geom, 'exterior'):
+        return np.array(geom.exterior.coords)[:, :2]
+    return np.array(geom.coords).reshape(-1, 2)[:, :2]
+
+
+# Write the layout in a columnar binary format: an uncompressed npz file, which can be memory-mapped
+# by scripts/layout.py.  Instead of polygons, leaf nodes are stored as centers and diameters,
+# and the hierarchy as the parent and Euler tour interval of every node.
+# The geometries must still be Shapely objects.
+def write_npz(output_path, leaf_nodes, edges, metanodes, height, root, bounding_box):
+    metanode_ids = sorted(metanodes.keys())
+    metanode_list = [metanodes[i] for i in metanode_ids]
+    rings = [_ring_coords(m['geometry']) for m in metanode_list]
+    ring_offsets = np.zeros(len(rings) + 1, dtype=np.int64)
+    ring_offsets[1:] = np.cumsum([len(r) for r in rings])
+
+    def parent_id(p):
+        return -1 if p is None else p
+
+    arrays = {
+        'leaf_id': np.array([n['id'] for n in leaf_nodes], dtype=np.int64),
+        'leaf_center': np.array([n['center'] for n in leaf_nodes], dtype=np.float64).reshape(-1, 2),
+        'leaf_diameter': np.array([n['diameter'] for n in leaf_nodes], dtype=np.float64),
+        'leaf_parent': np.array([parent_id(n['parent_metanode']) for n in leaf_nodes], dtype=np.int64),
+        'leaf_pre': np.array([n.get('pre', -1) for n in leaf_nodes], dtype=np.int64),
+        'leaf_post': np.array([n.get('post', -1) for n in leaf_nodes], dtype=np.int64),
+        'edge_id': np.array([e['id'] for e in edges], dtype=np.int64),
+        'edge_ends': np.array([e['ends'] for e in edges], dtype=np.int64).reshape(-1, 2),
+        'edge_coords': np.array([np.array(e['geometry'].coords)[:2, :2] for e in edges],
+                                dtype=np.float64).reshape(-1, 2, 2),
+        'metanode_id': np.array(metanode_ids, dtype=np.int64),
+        'metanode_parent': np.array([parent_id(m['parent_metanode']) for m in metanode_list], dtype=np.int64),
+        'metanode_level': np.array([m['level'] for m in metanode_list], dtype=np.int64),
+        'metanode_diameter': np.array([m['diameter'] for m in metanode_list], dtype=np.float64),
+        'metanode_coords': np.concatenate(rings) if rings else np.zeros((0, 2)),
+        'metanode_coord_offsets': ring_offsets,
+        'metanode_pre': np.array([m['pre'] for m in metanode_list], dtype=np.int64),
+        'metanode_post': np.array([m['post'] for m in metanode_list], dtype=np.int64),
+        'height': np.array(height, dtype=np.int64),
+        'root': np.array(root, dtype=np.int64),
+        'bounding_box': np.array(bounding_box, dtype=np.float64),
+    }
+    # np.savez (not savez_compressed) so that every array is stored uncompressed and can be memory-mapped
+    with open(output_path, 'wb') as f:
+        np.savez(f, **arrays)
+
+
+def convert(input_path, leaf_only=False, bounding_shape='convex_hull', output_format='json', ancestry_sets=False):
     graph = tlp.loadGraph(input_path)
 
     # Retrieve nodes and edges from graph and construct Shapely geometries
     view_layout = graph.getLayoutProperty('viewLayout')
     view_size = graph.getSizeProperty('viewSize')
 
+    # A leaf node is a circle: the polygon approximation in 'geometry' and the exact circle in 'center' and 'diameter'
     leaf_nodes = [{'id': n.id, 'parent_metanode': None,        # fulfill later
                    'geometry': Point(view_layout[n].x(), view_layout[n].y()).buffer(view_size[n][0] / 2.0, cap_style=CAP_STYLE.round),
+                   'center': (view_layout[n].x(), view_layout[n].y()),
                    'diameter': view_size[n][0]}
                   for n in graph.nodes()]
 
@@ -69,26 +129,32 @@ def convert(input_path, leaf_only=False, bounding_shape='convex_hull'):
     bbox = tlp.computeBoundingBox(graph)
     root = graph.getId()
     height = {'a': 1}
+    tour = {'a': 0}
     metanodes = {}
 
     # Construct a simple node (graph) hierarchy data structure from the tulip graph and count levels
     # This is the same level counting method in the Bourqui multi-level force layout paper.
+    # Every metanode and leaf node gets the interval [pre, post] of its Euler tour (numbered at entry and exit),
+    # so u is an ancestor of (or is) v iff u.pre <= v.pre and v.post <= u.post.  This answers whether a node is
+    # in a subgraph and whether two metanodes are on the same path of the node hierarchy.
 
     def dfs(g, cur_height):
         node = {'id': g.getId(),
                 'geometry': None,
                 'diameter': 0,
-                'desc_metanodes': {},
                 'parent_metanode': None,
-                'leaf_nodes': {},
-                'level': cur_height}
+                'level': cur_height,
+                'pre': tour['a']}
+        tour['a'] += 1
 
-        # For finding whether a node is in a subgraph
-        for leaf in g.getNodes():
-            node['leaf_nodes'][leaf.id] = True
-        # For finding whether two meta-nodes are on the same path of the node hierarchy
-        for s in g.getDescendantGraphs():
-            node['desc_metanodes'][s.getId()] = True
+        # The sets of all leaf nodes and descendant metanodes, O(n * depth) in total, only for old readers
+        if ancestry_sets:
+            node['leaf_nodes'] = {}
+            node['desc_metanodes'] = {}
+            for leaf in g.getNodes():
+                node['leaf_nodes'][leaf.id] = True
+            for s in g.getDescendantGraphs():
+                node['desc_metanodes'][s.getId()] = True
 
         height['a'] = max(height['a'], cur_height + 1)
         for s in g.getSubGraphs():
@@ -100,6 +166,11 @@ def convert(input_path, leaf_only=False, bounding_shape='convex_hull'):
             tmp = leaf_nodes[leaf.id]
             if tmp['parent_metanode'] is None:
                 tmp['parent_metanode'] = g.getId()
+                tmp['pre'] = tour['a']
+                tmp['post'] = tour['a'] + 1
+                tour['a'] += 2
+        node['post'] = tour['a']
+        tour['a'] += 1
 
         # Compute convex hull of this sub-graph in post-order
         if bounding_shape == 'convex_hull':
@@ -130,7 +201,17 @@ def convert(input_path, leaf_only=False, bounding_shape='convex_hull'):
     if not leaf_only:
         dfs(graph, root)
 
-    # Output json file at the same directory with same filename but "json" extension
+    bounding_box = [[bbox[0].x(), bbox[0].y()], [bbox[1].x(), bbox[1].y()]]
+    counts = {'nodes': len(leaf_nodes), 'edges': len(edges), 'metanodes': len(metanodes), 'height': height['a']}
+
+    # Output files at the same directory with same filename but "json" / "npz" extension
+    if output_format in ('npz', 'both'):
+        output_path = re.sub(r'\.tlp$', '.npz', input_path)
+        write_npz(output_path, leaf_nodes, edges, metanodes, height['a'], root, bounding_box)
+        print('Converted to ', output_path)
+    if output_format == 'npz':
+        return counts
+
     output_path = re.sub(r'\.tlp$', '.json', input_path)
 
     # Use the mapping function from shapely to serialize the geometry objects
@@ -147,21 +228,85 @@ def convert(input_path, leaf_only=False, bounding_shape='convex_hull'):
         'height': height['a'],
         'root': root,
         'metanodes': metanodes,
-        'bounding_box': [[bbox[0].x(), bbox[0].y()], [bbox[1].x(), bbox[1].y()]]
+        'bounding_box': bounding_box
     }
     json.dump(json_data, open(output_path, 'w'))
     print('Converted to ', output_path, ' #nodes:', len(leaf_nodes), ' #edges: ', len(edges), ' height: ', height['a'])
+    return counts
+
+
+# Whether the outputs of a tlp file exist and are newer than it
+def is_up_to_date(input_path, output_format='json'):
+    tlp_time = os.path.getmtime(input_path)
+    for ext in OUTPUT_EXTENSIONS[output_format]:
+        output_path = re.sub(r'\.tlp$', ext, input_path)
+        if not os.path.isfile(output_path) or os.path.getmtime(output_path) < tlp_time:
+            return False
+    return True
+
+
+# Convert one file in a worker process, return (input_path, seconds, counts, error message)
+def _convert_task(task):
+    input_path, kwargs = task
+    start = time.time()
+    try:
+        counts = convert(input_path, **kwargs)
+        return input_path, time.time() - start, counts, None
+    except Exception:
+        return input_path, time.time() - start, None, traceback.format_exc()
+
+
+# Convert every tlp file of a directory in a pool of worker processes, skipping the files whose outputs are newer
+# than the tlp file unless force is set.  Every file is reported when it is done.  Return the failed files.
+def convert_dir(input_dir, workers=None, force=False, **kwargs):
+    output_format = kwargs.get('output_format', 'json')
+    paths = sorted(os.path.join(input_dir, f) for f in os.listdir(input_dir) if f.endswith('.tlp'))
+    todo = [p for p in paths if force or not is_up_to_date(p, output_format)]
+    print('Converting', len(todo), 'of', len(paths), 'tlp files,', len(paths) - len(todo), 'up to date')
+    # largest files first so that they do not start last
+    todo.sort(key=os.path.getsize, reverse=True)
+
+    failed = []
+    start = time.time()
+    pool = Pool(workers)
+    try:
+        results = pool.imap_unordered(_convert_task, [(p, kwargs) for p in todo])
+        for i, (path, seconds, counts, error) in enumerate(results):
+            if error is None:
+                print('[{}/{}] {} {:.1f}s #nodes: {} #edges: {} #metanodes: {} height: {}'.format(
+                    i + 1, len(todo), os.path.basename(path), seconds,
+                    counts['nodes'], counts['edges'], counts['metanodes'], counts['height']))
+            else:
+                failed.append(path)
+                print('[{}/{}] {} failed:\n{}'.format(i + 1, len(todo), os.path.basename(path), error))
+    finally:
+        pool.close()
+        pool.join()
+    print('Done in {:.1f}s'.format(time.time() - start))
+    return failed
 
 
 if __name__ == '__main__':
-    tlp_file = '../../../data/test/test2.tlp' if len(sys.argv) < 2 else sys.argv[1]
+    parser = argparse.ArgumentParser()
+    parser.add_argument('tlp_file', nargs='?', default='../../../data/test/test2.tlp',
+                        help='a tlp file or a directory of tlp files')
+    parser.add_argument('--format', choices=['json', 'npz', 'both'], default='json')
+    parser.add_argument('--ancestry_sets', default=False, action='store_true',
+                        help='also write the leaf_nodes and desc_metanodes sets of every metanode')
+    parser.add_argument('--workers', default=None, type=int,
+                        help='number of worker processes for a directory, defaults to the number of CPUs')
+    parser.add_argument('--force', default=False, action='store_true',
+                        help='also convert the files whose outputs are newer than the tlp file')
+    args = parser.parse_args()
+    tlp_file = args.tlp_file
 
     if os.path.isdir(tlp_file):
         # convert every tlp file under this directory
-        for filename in os.listdir(tlp_file):
-            if filename.endswith('.tlp'):
-                convert(os.path.join(tlp_file, filename), bounding_shape='circle')
+        failed = convert_dir(tlp_file, workers=args.workers, force=args.force, bounding_shape='circle',
+                             output_format=args.format, ancestry_sets=args.ancestry_sets)
+        if failed:
+            print('Failed:', ', '.join(failed))
     elif os.path.isfile(tlp_file):
-        convert(tlp_file, bounding_shape='circle')
+        convert(tlp_file, bounding_shape='circle', output_format=args.format, ancestry_sets=args.ancestry_sets)
     else:
         print('Error: no file or directory found')
@@ -0,0 +1,112 @@
+# coding: utf-8
+
+# Node hierarchy queries over index arrays.
+# The nodes of a layout are the leaf nodes followed by the metanodes (the same order as for
+# geometric.get_layout_candidate_pairs).  Every node has an Euler tour interval [pre, post] (written by tlp2myjson),
+# so u is an ancestor of v, or v itself, iff pre[u] <= pre[v] and post[v] <= post[u]:
+# "is a leaf inside a metanode" and "are two metanodes on the same path of the hierarchy" are integer comparisons
+# that work on whole arrays of candidate pairs.
+
+import numpy as np
+
+
+def _is_metanode(node):
+    return 'level' in node
+
+
+# Compute the Euler tour intervals from the parent indices, for layout files without 'pre' / 'post'
+def _euler_tour(parent, num_nodes):
+    children = [[] for _ in range(num_nodes)]
+    roots = []
+    for v in range(num_nodes):
+        if parent[v] < 0:
+            roots.append(v)
+        else:
+            children[parent[v]].append(v)
+
+    pre = np.full(num_nodes, -1, dtype=np.int64)
+    post = np.full(num_nodes, -1, dtype=np.int64)
+    counter = 0
+    for r in roots:
+        pre[r] = counter
+        counter += 1
+        stack = [(r, iter(children[r]))]
+        while stack:
+            v, it = stack[-1]
+            c = next(it, None)
+            if c is None:
+                post[v] = counter
+                counter += 1
+                stack.pop()
+            else:
+                pre[c] = counter
+                counter += 1
+                stack.append((c, iter(children[c])))
+    return pre, post
+
+
+# Return the arrays (parent, pre, post) of the nodes: parent is the index of the parent metanode in nodes (-1 for
+# the root, or for leaf nodes of a leaf_only layout), pre and post the Euler tour interval of every node.
+def get_ancestry_index(nodes):
+    num_nodes = len(nodes)
+    metanode_index = {}
+    for k, n in enumerate(nodes):
+        if _is_metanode(n):
+            metanode_index[str(n['id'])] = k
+    parent = np.array([metanode_index.get(str(n['parent_metanode']), -1) for n in nodes], dtype=np.int64)
+
+    if all(n.get('pre', -1) >= 0 and n.get('post', -1) >= 0 for n in nodes):
+        pre = np.array([n['pre'] for n in nodes], dtype=np.int64)
+        post = np.array([n['post'] for n in nodes], dtype=np.int64)
+    else:
+        # children are visited in the order of nodes, so in a metanode its child metanodes come last,
+        # which gives different numbers than tlp2myjson but the same ancestry
+        pre, post = _euler_tour(parent, num_nodes)
+    return parent, pre, post
+
+
+# Whether u[k] is an ancestor of v[k] (or the same node), for index arrays u and v
+def is_ancestor(pre, post, u, v):
+    return (pre[u] <= pre[v]) & (post[v] <= post[u])
+
+
+# Whether u[k] and v[k] are on the same path from the root, i.e. one is an ancestor of the other
+def on_same_path(pre, post, u, v):
+    return is_ancestor(pre, post, u, v) | is_ancestor(pre, post, v, u)
+
+
+# Breakdown of the values of pairs by the levels of their two items, e.g. the penalty_by_level and count_by_level
+# matrices of the result json, in one bincount over all pairs.  A pair is counted in the cell
+# (min level, max level), so only the upper triangle (with the diagonal) is used, see level_mask.
+# Return the (num_levels, num_levels) matrices of the sums and of the counts.
+def level_breakdown(levels_a, levels_b, values, num_levels):
+    levels_a = np.asarray(levels_a, dtype=np.int64)
+    levels_b = np.asarray(levels_b, dtype=np.int64)
+    cell = np.minimum(levels_a, levels_b) * num_levels + np.maximum(levels_a, levels_b)
+    size = num_levels * num_levels
+    sums = np.bincount(cell, weights=np.asarray(values, dtype=float), minlength=size)
+    counts = np.bincount(cell, minlength=size)
+    return sums.reshape(num_levels, num_levels), counts.reshape(num_levels, num_levels)
+
+
+# The levels of the two items of the pairs ij (a (K, 2) index array) of a family: nodes for nn, node and edge for ne,
+# edges for ee.  The level of an edge is the deeper level of its two end nodes.
+def pair_levels(family, ij, node_levels, edge_levels):
+    levels_a = edge_levels if family == 'ee' else node_levels
+    levels_b = node_levels if family == 'nn' else edge_levels
+    return levels_a[ij[:, 0]], levels_b[ij[:, 1]]
+
+
+# The cells of a level breakdown that can hold pairs.  The other cells are 0 instead of a string like 'NA',
+# so the matrices stay numeric (NaN is not valid JSON for the front end either).
+def level_mask(num_levels):
+    return np.triu(np.ones((num_levels, num_levels), dtype=bool))
+
+
+# The breakdown matrices and their mask as json-serializable lists
+def level_breakdown_json(sums, counts):
+    return {
+        'penalty_by_level': sums.tolist(),
+        'count_by_level': counts.tolist(),
+        'by_level_mask': level_mask(len(sums)).tolist(),
+    }
@@ -0,0 +1,488 @@
+# coding: utf-8
+
+# Incremental NN / NE / EE overlap computation for interactive use, e.g. re-scoring a layout after a few nodes
+# are dragged or a metanode is opened.
+# The raw overlap (area, length, crossing angle) and the penalty of every overlapping pair are kept in memory,
+# together with the bounding boxes of all nodes and edges.  After a delta of moved / added / removed nodes, edges
+# or metanodes, only the pairs involving a changed node or edge are found again and recomputed.
+#
+# The penalty mapping is given by the caller as one function per family
+#   penalty_funcs[family](metrics, i, j, raw) -> array of penalties
+# where i and j are the index arrays of the pairs (node and node for nn, node and edge for ne, edge and edge for ee)
+# in metrics.nodes / metrics.edges, and raw the array of their overlap areas, lengths or crossing angles.
+# Without it the penalty is the raw value.
+#
+# Only the given families are computed.  With count_only, the NN and NE overlaps are not measured: the raw value of
+# an overlapping pair is 1, which is all the count-based metrics need.
+#
+# A leaf node with a 'center' (written by tlp2myjson) is a circle of its diameter: its NN overlap areas with other
+# circles and its NE overlap lengths are computed in closed form (geometric.get_circle_overlap_areas /
+# get_circle_segment_overlap_lengths) instead of with its polygon approximation.
+#
+# Nodes are keyed by ('leaf', id) or ('meta', id) and edges by their id, like the layout json.
+# Moving a leaf node changes its incident edges and the hulls of its metanodes: they are in the delta as well,
+# as computed by tlp2myjson.  So are the nodes whose parent_metanode changes, e.g. the children of an opened metanode.
+
+from contextlib import contextmanager
+import itertools
+import time
+
+import numpy as np
+from shapely.validation import explain_validity
+
+import dunne as dunne_metrics
+import geometric
+import hierarchy
+import poly_point_isect
+import profiling
+
+FAMILIES = ['nn', 'ne', 'ee']
+
+
+def node_key(node):
+    return ('meta' if 'level' in node else 'leaf', node['id'])
+
+
+def _empty_pairs():
+    return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+
+# Remove the duplicated pairs, with 1-d keys which sort much faster than np.unique(axis=0)
+def _unique_pairs(i, j):
+    if len(i) == 0:
+        return _empty_pairs()
+    n = int(max(i.max(), j.max())) + 1
+    keys = np.unique(i * n + j)
+    return keys // n, keys % n
+
+
+class IncrementalMetrics:
+    def __init__(self, leaf_nodes, metanodes, edges, penalty_funcs=None, profiler=None, families=FAMILIES,
+                 count_only=False, bounding_box=None):
+        self.penalty_funcs = penalty_funcs or {}
+        # the stages of all updates so far, see profiling.StageProfiler
+        self.profiler = profiler or profiling.StageProfiler()
+        self.families = [f for f in FAMILIES if f in families]
+        self.count_only = count_only
+        # [[min_x, min_y], [max_x, max_y]] of the layout json, if known
+        self.bounding_box = bounding_box
+        # per family: the wall time spent on its candidate pairs and exact geometry in all updates so far
+        self.family_seconds = {f: 0.0 for f in FAMILIES}
+        self.nodes = []
+        self.node_index = {}
+        self.node_bounds = np.zeros((0, 4))
+        self.node_geoms = np.zeros(0, dtype=object)
+        # [center_x, center_y, radius] of the circular leaf nodes, nan for the other nodes
+        self.node_circles = np.zeros((0, 3))
+        self.edges = []
+        self.edge_index = {}
+        self.edge_bounds = np.zeros((0, 4))
+        self.edge_geoms = np.zeros(0, dtype=object)
+        self.edge_segments = np.zeros((0, 2, 2))
+        self.edge_ends = np.zeros((0, 2), dtype=np.int64)
+        # per family: {(i, j): (raw, penalty)} of the overlapping pairs only
+        self.pairs = {f: {} for f in FAMILIES}
+        # per family and per node / edge index: the pairs it is in
+        self._pairs_of_node = {}
+        self._pairs_of_edge = {}
+        self.update(nodes=list(leaf_nodes) + list(metanodes), edges=edges)
+
+    @classmethod
+    def from_layout(cls, path, penalty_funcs=None, profiler=None, **options):
+        import layout
+        profiler = profiler or profiling.StageProfiler()
+        with profiler.stage('load'):
+            data = layout.load_layout(path)
+        return cls(data['leaf_nodes'], data['metanodes'].values(), data['edges'], penalty_funcs, profiler,
+                   bounding_box=data.get('bounding_box'), **options)
+
+    @contextmanager
+    def _family_time(self, family):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.family_seconds[family] += time.perf_counter() - start
+
+    # Raise ValueError if a geometry is not valid, e.g. a self-intersecting polygon, which GEOS cannot measure
+    @staticmethod
+    def _check_geometries(geoms, name, items):
+        for k in np.flatnonzero(~geometric.get_valid_flags(geoms)):
+            raise ValueError('invalid geometry of {} {}: {}'.format(name, items[k]['id'], explain_validity(geoms[k])))
+
+    # Removed nodes and edges keep their index, they are only left out of the candidate pairs.
+    # The bounds and geometries are computed by _node_geometry / _edge_geometry before anything is changed.
+    @classmethod
+    def _node_geometry(cls, nodes):
+        geoms = geometric.get_geometry_array([n['geometry'] for n in nodes])
+        cls._check_geometries(geoms, 'node', nodes)
+        circles = np.full((len(nodes), 3), np.nan)
+        round_nodes = [k for k, n in enumerate(nodes) if node_key(n)[0] == 'leaf' and n.get('center') is not None]
+        if round_nodes:
+            centers, radii = geometric.get_node_circles([nodes[k] for k in round_nodes])
+            circles[round_nodes, :2] = centers
+            circles[round_nodes, 2] = radii
+        return geometric.get_node_bounds(nodes), geoms, circles
+
+    @classmethod
+    def _edge_geometry(cls, edges):
+        geoms = geometric.get_geometry_array([e['geometry'] for e in edges])
+        cls._check_geometries(geoms, 'edge', edges)
+        ends = np.array([e['ends'] for e in edges], dtype=np.int64).reshape(-1, 2)
+        return geometric.get_bounds(geoms), geoms, geometric.get_segments(geoms), ends
+
+    def _set_nodes(self, nodes, new_bounds, new_geoms, new_circles):
+        changed = []
+        for n, b, g, c in zip(nodes, new_bounds, new_geoms, new_circles):
+            k = self.node_index.get(node_key(n))
+            if k is None:
+                k = len(self.nodes)
+                self.node_index[node_key(n)] = k
+                self.nodes.append(n)
+                self.node_bounds = np.vstack([self.node_bounds, b[None]])
+                self.node_geoms = np.append(self.node_geoms, None)
+                self.node_circles = np.vstack([self.node_circles, c[None]])
+            self.nodes[k] = n
+            self.node_bounds[k] = b
+            self.node_geoms[k] = g
+            self.node_circles[k] = c
+            changed.append(k)
+        return changed
+
+    def _set_edges(self, edges, new_bounds, new_geoms, new_segments, new_ends):
+        changed = []
+        for e, b, g, seg, ends in zip(edges, new_bounds, new_geoms, new_segments, new_ends):
+            k = self.edge_index.get(e['id'])
+            if k is None:
+                k = len(self.edges)
+                self.edge_index[e['id']] = k
+                self.edges.append(e)
+                self.edge_bounds = np.vstack([self.edge_bounds, b[None]])
+                self.edge_geoms = np.append(self.edge_geoms, None)
+                self.edge_segments = np.concatenate([self.edge_segments, np.zeros((1, 2, 2))])
+                self.edge_ends = np.concatenate([self.edge_ends, np.zeros((1, 2), dtype=np.int64)])
+            self.edges[k] = e
+            self.edge_bounds[k] = b
+            self.edge_geoms[k] = g
+            self.edge_segments[k] = seg
+            self.edge_ends[k] = ends
+            changed.append(k)
+        return changed
+
+    # The sets of pairs of the two items of a pair: node and edge for ne, both nodes or both edges otherwise
+    def _pair_index(self, family, key):
+        if family == 'ne':
+            return [(self._pairs_of_node, key[0]), (self._pairs_of_edge, key[1])]
+        index = self._pairs_of_node if family == 'nn' else self._pairs_of_edge
+        return [(index, key[0]), (index, key[1])]
+
+    def _add_pair(self, family, key, value):
+        self.pairs[family][key] = value
+        for index, k in self._pair_index(family, key):
+            index.setdefault(k, set()).add((family, key))
+
+    # Return the (raw, penalty) of the removed pair, or None if it was not there
+    def _remove_pair(self, family, key):
+        value = self.pairs[family].pop(key, None)
+        if value is not None:
+            for index, k in self._pair_index(family, key):
+                index.setdefault(k, set()).discard((family, key))
+        return value
+
+    # Remove the pairs of the given items, they are added to dropped as (family, key, value) for _rollback
+    def _drop_pairs(self, items, pairs_of, dropped):
+        for k in items:
+            for family, key in list(pairs_of.get(k, ())):
+                value = self._remove_pair(family, key)
+                if value is not None:
+                    dropped.append((family, key, value))
+
+    # Store the pairs of a family, their keys are added to stored as (family, key) for _rollback
+    def _store_pairs(self, family, i, j, raw, stored):
+        if len(i) == 0:
+            return
+        func = self.penalty_funcs.get(family)
+        with self.profiler.stage('penalty') as counts:
+            penalty = raw if func is None else np.asarray(func(self, i, j, raw), dtype=float)
+            counts[family + '_pairs'] = len(i)
+        for a, b, r, p in zip(i.tolist(), j.tolist(), raw.tolist(), penalty.tolist()):
+            stored.append((family, (a, b)))
+            self._add_pair(family, (a, b), (r, p))
+
+    # The state that update changes in place or replaces, except for the pairs, which are restored from the
+    # dropped and stored ones.  The lists and arrays are copied: O(nodes + edges), like the candidate search.
+    def _snapshot(self):
+        return {
+            'nodes': list(self.nodes), 'node_index': dict(self.node_index),
+            'node_bounds': self.node_bounds.copy(), 'node_geoms': self.node_geoms.copy(),
+            'node_circles': self.node_circles.copy(),
+            'edges': list(self.edges), 'edge_index': dict(self.edge_index),
+            'edge_bounds': self.edge_bounds.copy(), 'edge_geoms': self.edge_geoms.copy(),
+            'edge_segments': self.edge_segments.copy(), 'edge_ends': self.edge_ends.copy(),
+            'node_active': getattr(self, 'node_active', None), 'edge_active': getattr(self, 'edge_active', None),
+            'parent': getattr(self, 'parent', None), 'pre': getattr(self, 'pre', None),
+            'post': getattr(self, 'post', None),
+        }
+
+    def _rollback(self, snapshot, dropped, stored):
+        for family, key in stored:
+            self._remove_pair(family, key)
+        for family, key, value in dropped:
+            self._add_pair(family, key, value)
+        for name, value in snapshot.items():
+            setattr(self, name, value)
+
+    # The candidate pairs of the changed items against all active items, each pair once, as (i, j) with i < j
+    @staticmethod
+    def _changed_pairs(bounds, active, changed):
+        changed = np.asarray([k for k in changed if active[k]], dtype=np.int64)
+        others = np.flatnonzero(active)
+        if len(changed) == 0:
+            return _empty_pairs()
+        c, o = geometric.get_candidate_pairs(bounds[changed], bounds[others])
+        i, j = changed[c], others[o]
+        keep = i != j
+        return _unique_pairs(np.minimum(i[keep], j[keep]), np.maximum(i[keep], j[keep]))
+
+    # The candidate pairs (i in a, j in b) of the changed items of a against all active items of b and the other way
+    @staticmethod
+    def _cross_pairs(bounds_a, active_a, changed_a, bounds_b, active_b, changed_b):
+        others_a = np.flatnonzero(active_a)
+        others_b = np.flatnonzero(active_b)
+        changed_a = np.asarray([k for k in changed_a if active_a[k]], dtype=np.int64)
+        changed_b = np.asarray([k for k in changed_b if active_b[k]], dtype=np.int64)
+        i, j = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)]
+        if len(changed_a) and len(others_b):
+            c, o = geometric.get_candidate_pairs(bounds_a[changed_a], bounds_b[others_b])
+            i.append(changed_a[c])
+            j.append(others_b[o])
+        if len(changed_b) and len(others_a):
+            o, c = geometric.get_candidate_pairs(bounds_a[others_a], bounds_b[changed_b])
+            i.append(others_a[o])
+            j.append(changed_b[c])
+        return _unique_pairs(np.concatenate(i), np.concatenate(j))
+
+    # Nodes on the same path of the hierarchy do not overlap each other,
+    # an edge does not overlap the nodes containing one of its ends and edges sharing an end do not cross
+    def _node_node_excluded(self, i, j):
+        return hierarchy.on_same_path(self.pre, self.post, i, j)
+
+    def _node_edge_excluded(self, i, j):
+        end_nodes = np.array([[self.node_index.get(('leaf', v), -1) for v in ends] for ends in self.edge_ends.tolist()],
+                             dtype=np.int64).reshape(-1, 2)
+        excluded = np.zeros(len(i), dtype=bool)
+        for end in range(2):
+            ends = end_nodes[j, end]
+            valid = ends >= 0
+            excluded[valid] |= hierarchy.is_ancestor(self.pre, self.post, i[valid], ends[valid])
+        return excluded
+
+    # NN overlap areas (or flags with count_only) of the pairs (i, j): in closed form when both nodes are circles
+    def _node_node_overlaps(self, i, j):
+        c = self.node_circles
+        circle = ~np.isnan(c[i, 2]) & ~np.isnan(c[j, 2])
+        raw = np.zeros(len(i))
+        ci, cj = i[circle], j[circle]
+        raw[circle] = geometric.get_circle_overlap_areas(c[ci, :2], c[ci, 2], c[cj, :2], c[cj, 2])
+        if self.count_only:
+            raw[circle] = raw[circle] > 0
+            raw[~circle] = geometric.get_overlap_flags(self.node_geoms, self.node_geoms, i[~circle], j[~circle])
+        else:
+            raw[~circle] = geometric.get_overlap_areas(self.node_geoms, self.node_geoms, i[~circle], j[~circle])
+        return raw
+
+    # NE overlap lengths (or flags with count_only) of the pairs of nodes i and edges j: in closed form for a circle
+    def _node_edge_overlaps(self, i, j):
+        c = self.node_circles
+        circle = ~np.isnan(c[i, 2])
+        raw = np.zeros(len(i))
+        ci = i[circle]
+        raw[circle] = geometric.get_circle_segment_overlap_lengths(c[ci, :2], c[ci, 2], self.edge_segments[j[circle]])
+        if self.count_only:
+            raw[circle] = raw[circle] > 0
+            raw[~circle] = geometric.get_overlap_flags(self.node_geoms, self.edge_geoms, i[~circle], j[~circle])
+        else:
+            raw[~circle] = geometric.get_overlap_lengths(self.node_geoms, self.edge_geoms, i[~circle], j[~circle])
+        return raw
+
+    def _edge_edge_excluded(self, i, j):
+        a, b = self.edge_ends[i], self.edge_ends[j]
+        return (a[:, :1] == b).any(axis=1) | (a[:, 1:] == b).any(axis=1)
+
+    # Raise ValueError if a removed node or edge does not exist, or is also in the added ones
+    def _check_removed(self, nodes, edges, removed_nodes, removed_edges):
+        for removed, index, added, name in [(removed_nodes, self.node_index, [node_key(n) for n in nodes], 'node'),
+                                            (removed_edges, self.edge_index, [e['id'] for e in edges], 'edge')]:
+            added = set(added)
+            for key in removed:
+                if key not in index:
+                    raise ValueError('no {} {} to remove'.format(name, key))
+                if key in added:
+                    raise ValueError('{} {} is both changed and removed'.format(name, key))
+            if len(set(removed)) != len(removed):
+                raise ValueError('a {} is removed twice'.format(name))
+
+    # Apply a delta: nodes and edges are added, or replaced if their key exists, and the removed ones are given
+    # by their keys (node_key / edge id).  Only the pairs of the changed nodes and edges are recomputed.
+    # The delta is checked and its geometry computed before any change: ValueError for an unknown removed key or an
+    # invalid geometry.  On any other error during the update the state is rolled back, so after an error the state
+    # is always the one before the call.
+    # Return the new result(dunne).
+    def update(self, nodes=(), edges=(), removed_nodes=(), removed_edges=(), dunne=False):
+        nodes, edges = list(nodes), list(edges)
+        removed_nodes = [tuple(key) for key in removed_nodes]
+        removed_edges = list(removed_edges)
+        self._check_removed(nodes, edges, removed_nodes, removed_edges)
+        with self.profiler.stage('geometry') as counts:
+            node_geometry = self._node_geometry(nodes)
+            edge_geometry = self._edge_geometry(edges)
+            counts['nodes'] = len(nodes)
+            counts['edges'] = len(edges)
+        snapshot = self._snapshot()
+        dropped, stored = [], []
+        try:
+            self._apply(nodes, edges, removed_nodes, removed_edges, node_geometry, edge_geometry, dropped, stored)
+        except Exception:
+            self._rollback(snapshot, dropped, stored)
+            raise
+        return self.result(dunne)
+
+    # The changes of update, the dropped and stored pairs are added to the given lists
+    def _apply(self, nodes, edges, removed_nodes, removed_edges, node_geometry, edge_geometry, dropped, stored):
+        stage = self.profiler.stage
+        with stage('index'):
+            changed_nodes = self._set_nodes(nodes, *node_geometry)
+            changed_edges = self._set_edges(edges, *edge_geometry)
+            changed_nodes += [self.node_index.pop(key) for key in removed_nodes]
+            changed_edges += [self.edge_index.pop(key) for key in removed_edges]
+
+            node_active = np.zeros(len(self.nodes), dtype=bool)
+            node_active[list(self.node_index.values())] = True
+            edge_active = np.zeros(len(self.edges), dtype=bool)
+            edge_active[list(self.edge_index.values())] = True
+            self.node_active, self.edge_active = node_active, edge_active
+
+            self._drop_pairs(changed_nodes, self._pairs_of_node, dropped)
+            self._drop_pairs(changed_edges, self._pairs_of_edge, dropped)
+
+            # the ancestry of the unchanged nodes does not change, but the Euler tour numbers may
+            self.parent, self.pre, self.post = self._ancestry()
+
+        nn_i, nn_j = ne_i, ne_j = ee_i, ee_j = _empty_pairs()
+        with stage('candidates') as counts:
+            if 'nn' in self.families:
+                with self._family_time('nn'):
+                    nn_i, nn_j = self._changed_pairs(self.node_bounds, node_active, changed_nodes)
+                    keep = ~self._node_node_excluded(nn_i, nn_j)
+                    nn_i, nn_j = nn_i[keep], nn_j[keep]
+            if 'ne' in self.families:
+                with self._family_time('ne'):
+                    ne_i, ne_j = self._cross_pairs(self.node_bounds, node_active, changed_nodes,
+                                                   self.edge_bounds, edge_active, changed_edges)
+                    keep = ~self._node_edge_excluded(ne_i, ne_j)
+                    ne_i, ne_j = ne_i[keep], ne_j[keep]
+            if 'ee' in self.families:
+                with self._family_time('ee'):
+                    ee_i, ee_j = self._changed_pairs(self.edge_bounds, edge_active, changed_edges)
+                    keep = ~self._edge_edge_excluded(ee_i, ee_j)
+                    ee_i, ee_j = ee_i[keep], ee_j[keep]
+            counts.update(nn_pairs=len(nn_i), ne_pairs=len(ne_i), ee_pairs=len(ee_i))
+
+        with stage('exact_geometry') as counts:
+            with self._family_time('nn'):
+                nn_raw = self._node_node_overlaps(nn_i, nn_j)
+            with self._family_time('ne'):
+                ne_raw = self._node_edge_overlaps(ne_i, ne_j)
+            with self._family_time('ee'):
+                # the crossing angles are kept in count_only as well, they are cheap and the Dunne ratio needs them
+                s = poly_point_isect.segments_as_array(self.edge_segments)
+                crossing, _, _ = poly_point_isect.isect_seg_seg_v2_points(s, ee_i, ee_j)
+                ee_i, ee_j = ee_i[crossing], ee_j[crossing]
+                ee_raw = geometric.get_angles_between_line_segments(self.edge_segments[ee_i],
+                                                                    self.edge_segments[ee_j])
+            counts.update(nn_pairs=int(np.count_nonzero(nn_raw > 0)), ne_pairs=int(np.count_nonzero(ne_raw > 0)),
+                          ee_pairs=len(ee_raw))
+
+        self._store_pairs('nn', nn_i[nn_raw > 0], nn_j[nn_raw > 0], nn_raw[nn_raw > 0], stored)
+        self._store_pairs('ne', ne_i[ne_raw > 0], ne_j[ne_raw > 0], ne_raw[ne_raw > 0], stored)
+        self._store_pairs('ee', ee_i, ee_j, ee_raw, stored)
+
+    def _ancestry(self):
+        # removed nodes are kept as isolated nodes so that the indices stay valid
+        nodes = []
+        for k, n in enumerate(self.nodes):
+            if not self.node_active[k]:
+                n = {'id': n['id'], 'parent_metanode': None}
+            nodes.append(n)
+        return hierarchy.get_ancestry_index(nodes)
+
+    def remove_nodes(self, keys):
+        return self.update(removed_nodes=keys)
+
+    def remove_edges(self, ids):
+        return self.update(removed_edges=ids)
+
+    # Level of every node: its 'level' for a metanode, one more than its parent's for a leaf node
+    def node_levels(self):
+        levels = np.array([n.get('level', -1) for n in self.nodes], dtype=np.int64)
+        leaf = levels < 0
+        has_parent = leaf & (self.parent >= 0)
+        levels[has_parent] = levels[self.parent[has_parent]] + 1
+        levels[leaf & ~has_parent] = 0
+        return levels
+
+    # Level of every edge: the deeper level of its two end nodes
+    def edge_levels(self, node_levels=None):
+        if node_levels is None:
+            node_levels = self.node_levels()
+        levels = np.zeros(len(self.edges), dtype=np.int64)
+        for k, e in enumerate(self.edges):
+            ends = [self.node_index.get(('leaf', v)) for v in e['ends']]
+            levels[k] = max([node_levels[v] for v in ends if v is not None] or [0])
+        return levels
+
+    # The pairs and raw overlaps of every family as arrays, e.g. for the overlap cache:
+    # <family>_pairs (K, 2) and <family>_raw (K,), plus <family>_penalty (K,)
+    def raw_overlaps(self):
+        arrays = {}
+        for family in FAMILIES:
+            pairs = self.pairs[family]
+            ij = np.fromiter(itertools.chain.from_iterable(pairs.keys()), np.int64, 2 * len(pairs)).reshape(-1, 2)
+            values = np.fromiter(itertools.chain.from_iterable(pairs.values()), float, 2 * len(pairs)).reshape(-1, 2)
+            arrays[family + '_pairs'] = ij
+            arrays[family + '_raw'] = values[:, 0]
+            arrays[family + '_penalty'] = values[:, 1]
+        return arrays
+
+    # The current totals of every family, with the penalties and counts by pair of levels
+    # (upper triangular, see hierarchy.level_breakdown).  The level of an edge is the deeper level of its ends
+    # (edge_levels), and a pair is counted in the cell (lower level, higher level) whatever its family: for ne,
+    # a node at level 1 overlapping an edge at level 3 and a node at level 3 overlapping an edge at level 1 both
+    # go to the cell [1][3], like two nodes or two edges at levels 1 and 3.
+    # With dunne, the nn and ee families also get the dunne_ratio from the same pairs.
+    def result(self, dunne=False):
+        node_levels = self.node_levels()
+        edge_levels = self.edge_levels(node_levels)
+        num_levels = int(max(node_levels.max(initial=0), edge_levels.max(initial=0))) + 1
+        arrays = self.raw_overlaps()
+        result = {}
+        with self.profiler.stage('level_breakdown'):
+            for family in FAMILIES:
+                ij, penalty = arrays[family + '_pairs'], arrays[family + '_penalty']
+                levels_a, levels_b = hierarchy.pair_levels(family, ij, node_levels, edge_levels)
+                penalty_by_level, count_by_level = hierarchy.level_breakdown(levels_a, levels_b, penalty, num_levels)
+                result[family] = {
+                    'total_penalty': float(penalty.sum()),
+                    'total_count': len(penalty),
+                    'penalty_by_level': penalty_by_level,
+                    'count_by_level': count_by_level,
+                }
+
+        if dunne:
+            is_leaf = np.array([node_key(n)[0] == 'leaf' for n in self.nodes], dtype=bool) & self.node_active
+            node_areas = np.array([0.0 if g is None else g.area for g in self.node_geoms], dtype=float)
+            ratios = dunne_metrics.dunne_ratios(arrays['nn_pairs'], None if self.count_only else arrays['nn_raw'],
+                                                node_areas, is_leaf, arrays['ee_raw'])
+            for family, ratio in ratios.items():
+                result[family]['dunne_ratio'] = ratio
+        return result
@@ -0,0 +1,131 @@
+# coding: utf-8
+
+# Load the layouts written by graph-format-conversion/tlp2myjson.py,
+# either the json format (GeoJSON geometries) or the columnar npz format (numpy arrays).
+# The arrays of an npz layout are memory-mapped, so loading takes about the same time for any layout size.
+
+import json
+import os
+import zipfile
+
+import numpy as np
+
+
+# Memory-map the arrays of an uncompressed npz file (written by np.savez).
+# np.load ignores mmap_mode for npz files, so the offset of every .npy member is read from the zip headers.
+# Compressed members are loaded into memory instead.
+def _load_npz_mmap(path):
+    arrays = {}
+    with zipfile.ZipFile(path) as zf, open(path, 'rb') as f:
+        for info in zf.infolist():
+            name = info.filename[:-4] if info.filename.endswith('.npy') else info.filename
+            if info.compress_type != zipfile.ZIP_STORED:
+                with zf.open(info) as member:
+                    arrays[name] = np.lib.format.read_array(member, allow_pickle=False)
+                continue
+
+            # local file header: 30 bytes, then the file name and the extra field
+            f.seek(info.header_offset)
+            local_header = f.read(30)
+            name_length = int.from_bytes(local_header[26:28], 'little')
+            extra_length = int.from_bytes(local_header[28:30], 'little')
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            if dtype.hasobject:
+                raise ValueError('{}: object array {} cannot be memory-mapped'.format(path, name))
+            if int(np.prod(shape)) == 0:
+                arrays[name] = np.zeros(shape, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(path, dtype=dtype, mode='r', offset=f.tell(), shape=shape,
+                                         order='F' if fortran_order else 'C')
+    return arrays
+
+
+# Load an npz layout as a dict of arrays, see tlp2myjson.write_npz for the fields
+def load_layout_arrays(path, mmap=True):
+    if mmap:
+        return _load_npz_mmap(path)
+    with np.load(path, allow_pickle=False) as data:
+        return {name: data[name] for name in data.files}
+
+
+# Coordinates of the exterior ring of the i-th metanode (in the order of layout['metanode_id'])
+def metanode_coords(layout, i):
+    offsets = layout['metanode_coord_offsets']
+    return layout['metanode_coords'][offsets[i]:offsets[i + 1]]
+
+
+# Convert an npz layout to the same structure as json.load gives for the json layout (e.g. string keys),
+# but with Shapely geometries instead of GeoJSON mappings (shapely.geometry.mapping converts them), built by the
+# vectorized functions of Shapely 2.x when available: the circles of the leaf nodes are buffered like tlp2myjson does.
+def layout_arrays_to_dict(layout):
+    import shapely
+    from shapely.geometry import Point, LineString, Polygon
+
+    def parent_id(p):
+        return None if p < 0 else int(p)
+
+    centers = np.asarray(layout['leaf_center'], dtype=float).reshape(-1, 2)
+    diameters = np.asarray(layout['leaf_diameter'], dtype=float)
+    edge_coords = np.asarray(layout['edge_coords'], dtype=float).reshape(-1, 2, 2)
+    if hasattr(shapely, 'points'):
+        # quad_segs=16 is the resolution of Point.buffer in tlp2myjson
+        circles = shapely.buffer(shapely.points(centers), diameters / 2.0, quad_segs=16)
+        lines = shapely.linestrings(edge_coords)
+    else:
+        circles = [Point(c).buffer(d / 2.0) for c, d in zip(centers, diameters)]
+        lines = [LineString(coords) for coords in edge_coords]
+    leaf_nodes = [{'id': i, 'parent_metanode': parent_id(p),
+                   'geometry': g,
+                   'center': c,
+                   'diameter': d,
+                   'pre': pre,
+                   'post': post}
+                  for i, g, c, d, p, pre, post in zip(layout['leaf_id'].tolist(), circles, centers.tolist(),
+                                                      diameters.tolist(), layout['leaf_parent'],
+                                                      layout['leaf_pre'].tolist(), layout['leaf_post'].tolist())]
+    edges = [{'id': i, 'ends': ends, 'geometry': g}
+             for i, ends, g in zip(layout['edge_id'].tolist(), layout['edge_ends'].tolist(), lines)]
+
+    metanodes = {}
+    for k, i in enumerate(layout['metanode_id'].tolist()):
+        metanodes[str(i)] = {
+            'id': i,
+            'geometry': Polygon(metanode_coords(layout, k)),
+            'diameter': float(layout['metanode_diameter'][k]),
+            'parent_metanode': parent_id(layout['metanode_parent'][k]),
+            'level': int(layout['metanode_level'][k]),
+            'pre': int(layout['metanode_pre'][k]),
+            'post': int(layout['metanode_post'][k]),
+        }
+
+    return {
+        'leaf_nodes': leaf_nodes,
+        'edges': edges,
+        'height': int(layout['height']),
+        'root': int(layout['root']),
+        'metanodes': metanodes,
+        'bounding_box': layout['bounding_box'].tolist(),
+    }
+
+
+# Load a layout as the json structure, from a .json or an .npz file
+def load_layout(path):
+    if os.path.splitext(path)[1] == '.npz':
+        return layout_arrays_to_dict(load_layout_arrays(path))
+    with open(path) as f:
+        return json.load(f)
+
+
+# Path of the layout called name in data_dir, the npz format first.  Raise IOError if there is none.
+def find_layout(data_dir, name):
+    for ext in ['.npz', '.json']:
+        path = os.path.join(data_dir, name + ext)
+        if os.path.isfile(path):
+            return path
+    raise IOError('no layout {} in {}'.format(name, data_dir))
@@ -0,0 +1,287 @@
+# coding: utf-8
+
+# A long-running local metrics service, so that imports and layout parsing are paid once instead of once per run.
+#
+#   POST /metrics  {"layout": name, "alpha_nn": .., "alpha_ne": .., "alpha_ee": .., "ee": .., "skip_...": ..}
+#       Answer the metrics of <data_dir>/<name> in the schema of the <name>_result.json files read by the
+#       comparative-analysis front end, evaluated by metrics_pass from the overlaps of the layout in memory.
+#   POST /update   {"layout": name, "nodes": [..], "edges": [..], "removed_nodes": [["leaf", id], ..],
+#                   "removed_edges": [id, ..], "alpha_nn": .., ...}
+#       Apply a delta (in the layout json format) to the in-memory layout, see incremental.IncrementalMetrics, and
+#       answer its metrics in the same schema.
+#   POST /reset    {"layout": name}
+#       Drop the layout from memory, so that the next request parses its file again without the deltas.
+#   GET /layouts
+#       The layouts in memory, their estimated sizes and whether they were modified.
+#
+# The deltas stay in the layout in memory: /metrics answers the modified layout until a /reset, or until its file
+# changes.  The answers of /metrics and /update have "modified": true when the layout in memory is not its file.
+#
+# A layout name is a file name in data_dir without extension.  The status is 404 for a layout that does not exist,
+# 400 for a bad request (bad json, missing or bad field, unknown node or edge in a delta) and 500 otherwise.
+# The answers also have the 'profile' of the request: wall time, CPU time, process max RSS and pair counts of every stage,
+# see profiling.StageProfiler.
+#
+# The parsed layouts, with their spatial indexes and overlapping pairs, are kept in an LRU cache limited by size.
+
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import argparse
+import json
+import os
+import socket
+import socketserver
+import time
+import traceback
+
+import incremental
+import layout
+import metrics_pass
+
+# The request fields of the parameters and their defaults, every family is always computed in memory
+RUN_PARAMETERS = {
+    'alpha_nn': 0.2,
+    'alpha_ne': 0.2,
+    'alpha_ee': 0.2,
+    'ee': 'linear',
+    'area_penalty': 'power',
+    'skip_Dunne_metrics': False,
+    'skip_level_breakdown': False,
+}
+
+# Rough memory of a stored overlapping pair (tuple key and value in a dict plus the index sets)
+PAIR_BYTES = 400
+
+
+class BadRequest(Exception):
+    pass
+
+
+class LayoutNotFound(Exception):
+    pass
+
+
+# The file of a layout, which must be directly in data_dir: a name with a path separator or '..' is a bad request
+def layout_path(data_dir, name):
+    if not isinstance(name, str) or not name or name in ('.', '..') or '\0' in name \
+            or os.sep in name or (os.altsep and os.altsep in name):
+        raise BadRequest('bad layout name {!r}'.format(name))
+    try:
+        path = layout.find_layout(data_dir, name)
+    except IOError:
+        raise LayoutNotFound('no layout {}'.format(name))
+    # a symbolic link may still point out of data_dir
+    if os.path.dirname(os.path.realpath(path)) != os.path.realpath(data_dir):
+        raise LayoutNotFound('no layout {}'.format(name))
+    return path
+
+
+# The parameters of metrics_pass.evaluate from the fields of a request
+def request_parameters(request):
+    params = {k: request.get(k, v) for k, v in RUN_PARAMETERS.items()}
+    for k in ['alpha_nn', 'alpha_ne', 'alpha_ee']:
+        if isinstance(params[k], bool) or not isinstance(params[k], (int, float)) or not 0 <= params[k] <= 1:
+            raise BadRequest('{} must be a number in [0, 1]'.format(k))
+    if params['ee'] not in metrics_pass.ANGLE_PENALTY_FUNCS:
+        raise BadRequest('ee must be one of {}'.format(', '.join(sorted(metrics_pass.ANGLE_PENALTY_FUNCS))))
+    if params['area_penalty'] not in metrics_pass.AREA_PENALTY_FUNCS:
+        raise BadRequest('area_penalty must be one of {}'.format(', '.join(sorted(metrics_pass.AREA_PENALTY_FUNCS))))
+    params['angle_penalty_func_type'] = params.pop('ee')
+    params['area_penalty_func_type'] = params.pop('area_penalty')
+    return params
+
+
+class LayoutCache:
+    def __init__(self, data_dir, max_bytes):
+        self.data_dir = data_dir
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+
+    @staticmethod
+    def estimate_size(entry):
+        metrics = entry['metrics']
+        num_pairs = sum(len(p) for p in metrics.pairs.values())
+        return entry['file_size'] * 4 + num_pairs * PAIR_BYTES
+
+    # The IncrementalMetrics of a layout, parsed again if the layout file changed, and its family_seconds before
+    # this call (all 0 for a layout parsed by this call)
+    def get(self, name):
+        path = layout_path(self.data_dir, name)
+        mtime = os.path.getmtime(path)
+        entry = self.entries.get(name)
+        if entry is None or entry['mtime'] != mtime:
+            entry = {'metrics': incremental.IncrementalMetrics.from_layout(path), 'mtime': mtime,
+                     'file_size': os.path.getsize(path), 'modified': False}
+            self.entries[name] = entry
+            family_seconds = {f: 0.0 for f in incremental.FAMILIES}
+        else:
+            family_seconds = dict(entry['metrics'].family_seconds)
+        self.entries.move_to_end(name)
+        self.update_size(name)
+        return entry['metrics'], family_seconds
+
+    # Estimate the size of a layout again after its pairs changed, modified after a delta
+    def update_size(self, name, modified=False):
+        entry = self.entries[name]
+        entry['size'] = self.estimate_size(entry)
+        entry['modified'] = entry['modified'] or modified
+        self.evict()
+
+    def is_modified(self, name):
+        return name in self.entries and self.entries[name]['modified']
+
+    # Drop a layout from memory, return whether it was there
+    def reset(self, name):
+        layout_path(self.data_dir, name)
+        return self.entries.pop(name, None) is not None
+
+    # Remove the least recently used layouts until the cache fits in max_bytes, always keeping the last one
+    def evict(self):
+        total = sum(e['size'] for e in self.entries.values())
+        while total > self.max_bytes and len(self.entries) > 1:
+            _, entry = self.entries.popitem(last=False)
+            total -= entry['size']
+
+    def summary(self):
+        return [{'layout': name, 'size': e['size'], 'modified': e['modified']} for name, e in self.entries.items()]
+
+
+# The result json of a layout in memory, with the execution_time of the request: the geometry time of every family
+# since family_seconds (from before the request) and an equal share of the rest of the time since start
+def metrics_result(name, metrics, parameters, start, family_seconds):
+    seconds = {f: metrics.family_seconds[f] - family_seconds[f] for f in incremental.FAMILIES}
+    shared = time.perf_counter() - start - sum(seconds.values())
+    overlaps = metrics_pass.overlap_arrays(metrics, seconds, shared)
+    return metrics_pass.evaluate(name, overlaps, parameters, metrics.profiler)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    server_version = 'SprawlterMetrics/1.0'
+
+    def address_string(self):
+        # client_address is empty for a Unix socket
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length).decode('utf-8')) if length else {}
+        except ValueError as e:
+            raise BadRequest('bad json: {}'.format(e))
+        if not isinstance(request, dict):
+            raise BadRequest('the request must be a json object')
+        return request
+
+    def do_GET(self):
+        if self.path == '/layouts':
+            self.send_json(self.server.layouts.summary())
+        else:
+            self.send_json({'error': 'not found'}, 404)
+
+    def do_POST(self):
+        handlers = {'/metrics': self.handle_metrics, '/update': self.handle_update, '/reset': self.handle_reset}
+        if self.path not in handlers:
+            self.send_json({'error': 'not found'}, 404)
+            return
+        try:
+            self.send_json(handlers[self.path](self.read_json()))
+        except LayoutNotFound as e:
+            self.send_json({'error': str(e)}, 404)
+        except BadRequest as e:
+            self.send_json({'error': str(e)}, 400)
+        except Exception as e:
+            traceback.print_exc()
+            self.send_json({'error': repr(e)}, 500)
+
+    # The layout and parameters of a request, the layout parsed if it is not in memory
+    def request_layout(self, request):
+        if 'layout' not in request:
+            raise BadRequest('missing field layout')
+        params = request_parameters(request)
+        start = time.perf_counter()
+        metrics, family_seconds = self.server.layouts.get(request['layout'])
+        return request['layout'], metrics, params, start, family_seconds
+
+    def answer(self, name, metrics, params, start, family_seconds):
+        answer = metrics_result(name, metrics, params, start, family_seconds)
+        answer['modified'] = self.server.layouts.is_modified(name)
+        # the stages since the last request, i.e. with the parsing of a layout that was not in memory
+        answer['profile'] = metrics.profiler.as_dict()
+        metrics.profiler.reset()
+        return answer
+
+    def handle_metrics(self, request):
+        return self.answer(*self.request_layout(request))
+
+    def handle_update(self, request):
+        name, metrics, params, start, family_seconds = self.request_layout(request)
+        try:
+            removed_nodes = [tuple(k) for k in request.get('removed_nodes', [])]
+            metrics.update(nodes=request.get('nodes', []),
+                           edges=request.get('edges', []),
+                           removed_nodes=removed_nodes,
+                           removed_edges=request.get('removed_edges', []))
+        except (ValueError, TypeError, KeyError) as e:
+            # update leaves the layout in memory as it was on any error: it checks the keys and geometries of the
+            # delta before changing anything and rolls back on a later error, which is then answered with a 500
+            raise BadRequest('bad delta: {!r}'.format(e))
+        self.server.layouts.update_size(name, modified=True)
+        return self.answer(name, metrics, dict(params, incremental=True), start, family_seconds)
+
+    def handle_reset(self, request):
+        if 'layout' not in request:
+            raise BadRequest('missing field layout')
+        return {'layout': request['layout'], 'reset': self.server.layouts.reset(request['layout'])}
+
+
+class MetricsServer(HTTPServer):
+    def __init__(self, address, data_dir, cache_bytes):
+        HTTPServer.__init__(self, address, MetricsHandler)
+        self.data_dir = data_dir
+        self.layouts = LayoutCache(data_dir, cache_bytes)
+
+
+class UnixMetricsServer(MetricsServer):
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        # HTTPServer.server_bind looks up a host name, which a Unix socket does not have
+        socketserver.TCPServer.server_bind(self)
+        self.server_name = 'localhost'
+        self.server_port = 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--data_dir', required=True)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', default=8765, type=int)
+    parser.add_argument('--socket', default=None, help='listen on this Unix socket instead of host:port')
+    parser.add_argument('--cache_mb', default=2048, type=float, help='size limit of the layouts kept in memory')
+    args = parser.parse_args()
+    print(args)
+
+    cache_bytes = int(args.cache_mb * (1 << 20))
+
+    if args.socket:
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+        server = UnixMetricsServer(args.socket, args.data_dir, cache_bytes)
+        print('Listening on', args.socket)
+    else:
+        server = MetricsServer((args.host, args.port), args.data_dir, cache_bytes)
+        print('Listening on {}:{}'.format(args.host, args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
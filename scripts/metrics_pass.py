@@ -0,0 +1,267 @@
+# coding: utf-8
+
+# The SA metrics of a layout in two parts, so that a parameter study pays the geometry once per layout:
+#   layout_overlaps(path) loads the layout and finds the overlapping NN / NE / EE pairs and their raw overlaps
+#       (areas, lengths, crossing angles) with incremental.IncrementalMetrics, together with everything else the
+#       metrics need (levels, node areas and diameters, edge lengths, layout area), as a dict of arrays.
+#   evaluate(name, overlaps, parameters) maps the raw overlaps to penalties for one parameter combination (alphas and
+#       penalty function types) and returns the result json read by the comparative-analysis front end, with the
+#       level breakdowns, the sprawl and the Dunne ratios computed from the same pairs.  It is cheap.
+#
+# The penalty functions are the ones plotted in analysis/function plot.ipynb.  An overlap x is mapped to
+# k * x^g + alpha * m^g, where m is the largest possible overlap of the pair, so alpha is the minimum penalty fraction
+# and a half overlap (x = m / 2) costs m^g:
+#   nn: x the overlap area, m the area of the smaller node, g = 0.7 ('power') or 1 ('linear')
+#   ne: x the overlap length, m the shorter of the edge length and the node diameter, g = 1 ('linear')
+#   ee: x = pi/2 - the crossing angle, so a right angle costs the least, 'linear' or 'quadratic' with f(pi/4) = 1
+#
+# The result json also has:
+#   graph.totalArea  the area of the layout bounding box
+#   metrics.sprawl   totalArea / the total area of the leaf nodes
+#   <family>.sc      the Sprawlter metric of the family, sprawl * total_penalty
+#   <family>.total_overlap  the sum of the raw overlaps (crossing angles in radians for ee)
+#
+# In a count-only pass (count_only) the EE crossings of layout_overlaps are only counted by level, with
+# poly_point_isect.isect_segments_count, without keeping the pairs or their angles: there is then no ee dunne_ratio
+# and the ee total_overlap is 0.
+
+import json
+import math
+import os
+import time
+
+import numpy as np
+
+import dunne
+import hierarchy
+import incremental
+import overlap_cache
+import poly_point_isect
+import profiling
+
+FAMILIES = incremental.FAMILIES
+
+DEFAULT_PARAMETERS = {
+    'alpha_nn': 0.2,
+    'alpha_ne': 0.2,
+    'alpha_ee': 0.2,
+    'area_penalty_func_type': 'power',
+    'length_penalty_func_type': 'linear',
+    'angle_penalty_func_type': 'linear',
+    'skip_level_breakdown': False,
+    'skip_Dunne_metrics': False,
+}
+
+
+def area_power_penalty(x, m, alpha):
+    beta = (1 - 1 / 0.5 ** 0.7) * alpha + 1 / 0.5 ** 0.7
+    return (beta - alpha) * np.power(x, 0.7) + alpha * np.power(m, 0.7)
+
+
+def linear_penalty(x, m, alpha):
+    beta = 2 - alpha
+    return (beta - alpha) * x + alpha * m
+
+
+def angle_linear_penalty(x, alpha):
+    beta = 4 / math.pi - alpha
+    return (beta - alpha) * x + alpha * math.pi / 2
+
+
+def angle_quadratic_penalty(x, alpha):
+    beta = 16 / math.pi ** 2 - 3 * alpha
+    return (beta - alpha) * np.square(x) + alpha * math.pi ** 2 / 4
+
+
+AREA_PENALTY_FUNCS = {'power': area_power_penalty, 'linear': linear_penalty}
+LENGTH_PENALTY_FUNCS = {'linear': linear_penalty}
+ANGLE_PENALTY_FUNCS = {'linear': angle_linear_penalty, 'quadratic': angle_quadratic_penalty}
+
+
+# The penalties of the pairs ij of a family with raw overlaps raw
+def family_penalty(family, overlaps, ij, raw, params):
+    if overlaps['count_only'] and family != 'ee':
+        return np.ones(len(raw))
+    if family == 'nn':
+        area = overlaps['node_area']
+        m = np.minimum(area[ij[:, 0]], area[ij[:, 1]])
+        return AREA_PENALTY_FUNCS[params['area_penalty_func_type']](raw, m, params['alpha_nn'])
+    if family == 'ne':
+        m = np.minimum(overlaps['edge_length'][ij[:, 1]], overlaps['node_diameter'][ij[:, 0]])
+        return LENGTH_PENALTY_FUNCS[params['length_penalty_func_type']](raw, m, params['alpha_ne'])
+    if overlaps['count_only']:
+        return np.ones(len(raw))
+    return ANGLE_PENALTY_FUNCS[params['angle_penalty_func_type']](math.pi / 2 - raw, params['alpha_ee'])
+
+
+# The number of levels of the level breakdowns, from the levels of the nodes and edges not removed
+def _num_levels(node_levels, edge_levels, node_active, edge_active):
+    return int(max(node_levels[node_active].max(initial=0), edge_levels[edge_active].max(initial=0))) + 1
+
+
+# The (num_levels, num_levels) matrix of the number of crossing EE pairs by level (see hierarchy.level_breakdown) of
+# an IncrementalMetrics computed without the ee family.  The segments of the edges are chopped at the node
+# boundaries, so the edges sharing an end node, which IncrementalMetrics leaves out, do not cross here either.
+def count_edge_crossings(metrics):
+    node_levels = metrics.node_levels()
+    edge_levels = metrics.edge_levels(node_levels)
+    num_levels = _num_levels(node_levels, edge_levels, metrics.node_active, metrics.edge_active)
+    active = np.flatnonzero(metrics.edge_active)
+    _, count_by_level = poly_point_isect.isect_segments_count(
+        metrics.edge_segments[active].tolist(), levels=edge_levels[active], num_levels=num_levels, engine='auto')
+    return count_by_level
+
+
+# Area of the [[min_x, min_y], [max_x, max_y]] bounding box of the layout json, or of the bounds of its nodes
+def _layout_area(metrics):
+    if metrics.bounding_box is not None:
+        (x0, y0), (x1, y1) = metrics.bounding_box
+    else:
+        bounds = metrics.node_bounds[metrics.node_active]
+        if len(bounds) == 0:
+            return 0.0
+        x0, y0 = bounds[:, :2].min(axis=0)
+        x1, y1 = bounds[:, 2:].max(axis=0)
+    return abs((x1 - x0) * (y1 - y0))
+
+
+# The arrays evaluate needs from an IncrementalMetrics, e.g. the one of a layout kept in memory by metrics-server.
+# family_seconds and shared_seconds are the times reported as execution_time, by default the family times of
+# the IncrementalMetrics and no shared time.
+def overlap_arrays(metrics, family_seconds=None, shared_seconds=0.0):
+    node_levels = metrics.node_levels()
+    family_seconds = family_seconds or metrics.family_seconds
+    arrays = {name: a for name, a in metrics.raw_overlaps().items() if not name.endswith('_penalty')}
+    arrays.update(
+        families=np.array([f in metrics.families for f in FAMILIES]),
+        count_only=np.array(metrics.count_only),
+        node_level=node_levels,
+        edge_level=metrics.edge_levels(node_levels),
+        node_active=metrics.node_active.copy(),
+        edge_active=metrics.edge_active.copy(),
+        node_is_leaf=np.array([incremental.node_key(n)[0] == 'leaf' for n in metrics.nodes], dtype=bool),
+        node_area=np.array([0.0 if g is None else g.area for g in metrics.node_geoms], dtype=float),
+        node_diameter=np.array([n.get('diameter', 0.0) for n in metrics.nodes], dtype=float),
+        edge_length=np.linalg.norm(metrics.edge_segments[:, 1] - metrics.edge_segments[:, 0], axis=1),
+        layout_area=np.array(_layout_area(metrics), dtype=float),
+        family_seconds=np.array([family_seconds[f] for f in FAMILIES], dtype=float),
+        shared_seconds=np.array(shared_seconds, dtype=float),
+    )
+    return arrays
+
+
+# Load a layout file and compute the arrays of overlap_arrays, with only the given families.
+# With count_only, the EE crossings are counted by count_edge_crossings into an ee_count_by_level array instead.
+# The time not spent on a single family (loading, geometry construction, hierarchy) is the shared time.
+# The arrays are reused from the overlap cache when it is set up (see overlap_cache.get_default_cache) and the layout
+# and the code are unchanged; their times are then those of the run that computed them, and the profiler only gets
+# an overlap_cache stage instead of the stages of IncrementalMetrics.
+def layout_overlaps(path, families=FAMILIES, count_only=False, profiler=None, cache=None):
+    profiler = profiler or profiling.StageProfiler()
+    computed = []
+
+    def compute():
+        start = time.perf_counter()
+        count_ee = count_only and 'ee' in families
+        metrics = incremental.IncrementalMetrics.from_layout(
+            path, profiler=profiler, families=[f for f in families if not (count_ee and f == 'ee')],
+            count_only=count_only)
+        family_seconds = dict(metrics.family_seconds)
+        if count_ee:
+            with profiler.stage('count_crossings') as counts:
+                ee_start = time.perf_counter()
+                count_by_level = count_edge_crossings(metrics)
+                family_seconds['ee'] = time.perf_counter() - ee_start
+                counts['ee_pairs'] = int(count_by_level.sum())
+        seconds = time.perf_counter() - start
+        computed.append(True)
+        arrays = overlap_arrays(metrics, family_seconds, shared_seconds=seconds - sum(family_seconds.values()))
+        if count_ee:
+            arrays.update(families=np.array([f in families for f in FAMILIES]), ee_count_by_level=count_by_level)
+        return arrays
+
+    options = {'families': [f for f in FAMILIES if f in families], 'count_only': bool(count_only)}
+    wall, cpu = time.perf_counter(), time.process_time()
+    overlaps = overlap_cache.cached_overlaps(path, compute, cache, options)
+    if not computed:
+        profiler.add('overlap_cache', time.perf_counter() - wall, time.process_time() - cpu)
+    return overlaps
+
+
+# The result json of one parameter combination from the arrays of layout_overlaps / overlap_arrays.
+# The execution_time of a family is its own time plus an equal share of the shared time, so that the sum over the
+# families is the time of the whole run, plus the time of its penalty mapping and level breakdown.
+def evaluate(name, overlaps, parameters=None, profiler=None):
+    params = dict(DEFAULT_PARAMETERS, **(parameters or {}))
+    profiler = profiler or profiling.StageProfiler()
+    computed = [f for f, c in zip(FAMILIES, overlaps['families'].tolist()) if c]
+    node_levels, edge_levels = overlaps['node_level'], overlaps['edge_level']
+    node_active, edge_active = overlaps['node_active'], overlaps['edge_active']
+    is_leaf = overlaps['node_is_leaf'] & node_active
+    num_levels = _num_levels(node_levels, edge_levels, node_active, edge_active)
+
+    leaf_area = float(overlaps['node_area'][is_leaf].sum())
+    total_area = float(overlaps['layout_area'])
+    sprawl = total_area / leaf_area if leaf_area > 0 else 0.0
+
+    result = {'sprawl': sprawl}
+    for k, family in enumerate(FAMILIES):
+        start = time.perf_counter()
+        with profiler.stage('metrics') as counts:
+            ij, raw = overlaps[family + '_pairs'], overlaps[family + '_raw']
+            # only counted by level, with a penalty of 1 per pair (see layout_overlaps)
+            count_by_level = overlaps.get(family + '_count_by_level')
+            if count_by_level is None:
+                penalty = family_penalty(family, overlaps, ij, raw, params)
+                total_penalty, total_count = float(penalty.sum()), len(raw)
+            else:
+                total_count = int(count_by_level.sum())
+                total_penalty = float(total_count)
+            m = {
+                'total_penalty': total_penalty,
+                'total_count': total_count,
+                'total_overlap': float(raw.sum()),
+                'sc': sprawl * total_penalty,
+            }
+            if family not in computed:
+                m['skipped'] = True
+            if not params['skip_level_breakdown']:
+                if count_by_level is None:
+                    levels_a, levels_b = hierarchy.pair_levels(family, ij, node_levels, edge_levels)
+                    breakdown = hierarchy.level_breakdown(levels_a, levels_b, penalty, num_levels)
+                else:
+                    breakdown = count_by_level.astype(float), count_by_level
+                m.update(hierarchy.level_breakdown_json(*breakdown))
+            counts[family + '_pairs'] = total_count
+        shared = float(overlaps['shared_seconds']) / len(computed) if family in computed else 0.0
+        m['execution_time'] = float(overlaps['family_seconds'][k]) + shared + time.perf_counter() - start
+        result[family] = m
+
+    if not params['skip_Dunne_metrics']:
+        with profiler.stage('dunne'):
+            nn_areas = None if overlaps['count_only'] else overlaps['nn_raw']
+            ratios = dunne.dunne_ratios(overlaps['nn_pairs'], nn_areas, overlaps['node_area'], is_leaf,
+                                        overlaps['ee_raw'])
+            for family, ratio in ratios.items():
+                if family in computed and family + '_count_by_level' not in overlaps:
+                    result[family]['dunne_ratio'] = ratio
+
+    num_metanodes = int(np.count_nonzero(node_active & ~overlaps['node_is_leaf']))
+    return {
+        'name': name,
+        'graph': {
+            'numberOfNodes': int(np.count_nonzero(is_leaf)),
+            'numberOfEdges': int(np.count_nonzero(edge_active)),
+            'numberOfMetaNodes': num_metanodes,
+            'numberOfLevels': num_levels,
+            'totalArea': total_area,
+        },
+        'metrics': result,
+        'parameters': params,
+        'end_time': time.time(),
+    }
+
+
+def write_result(result, output_dir):
+    with open(os.path.join(output_dir, result['name'] + '_result.json'), 'w') as f:
+        json.dump(result, f, indent=2)
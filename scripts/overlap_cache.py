@@ -0,0 +1,149 @@
+# coding: utf-8
+
+# On-disk cache of the raw overlap data of a layout, i.e. the geometry part of the metrics that does not
+# depend on the penalty parameters (alphas, penalty function types):
+#   nn: pairs of overlapping nodes and their overlap areas
+#   ne: pairs of overlapping node and edge and the lengths of the overlaps
+#   ee: pairs of crossing edges and their crossing angles
+# An entry is a dict of numpy arrays stored as one .npz file, keyed by the hash of the layout json
+# and of the code computing the overlaps, so an entry is never reused for a changed layout or changed code.
+# The least recently used entries are removed when the cache grows over its size limit.
+
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'sprawlter-metrics', 'overlaps')
+DEFAULT_MAX_BYTES = 1 << 30
+
+# Environment variables for the cache used by default, so that it can be set up once for all the
+# processes of a run (see --overlap_cache in run-all.py).  An empty directory disables the cache.
+CACHE_DIR_ENV = 'SPRAWLTER_OVERLAP_CACHE'
+CACHE_SIZE_ENV = 'SPRAWLTER_OVERLAP_CACHE_MB'
+
+# Source files the raw overlaps depend on, relative to this directory
+CODE_FILES = ['geometric.py', 'poly_point_isect.py', 'hierarchy.py', 'incremental.py', 'layout.py', 'metrics_pass.py']
+
+
+def _hash_file(h, path, chunk_size=1 << 20):
+    with open(path, 'rb') as f:
+        chunk = f.read(chunk_size)
+        while chunk:
+            h.update(chunk)
+            chunk = f.read(chunk_size)
+
+
+# Hash of the code computing the overlaps.  Files missing in this tree are skipped.
+def code_version(files=None):
+    h = hashlib.sha1()
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name in files or CODE_FILES:
+        path = os.path.join(here, name)
+        if os.path.isfile(path):
+            h.update(name.encode('utf-8'))
+            _hash_file(h, path)
+    return h.hexdigest()
+
+
+# Cache key of a layout json file (output of tlp2myjson.convert).
+# Extra parameters that change the raw overlaps (e.g. skipped computations) can be given in options.
+def layout_key(layout_path, version=None, options=None):
+    h = hashlib.sha1()
+    _hash_file(h, layout_path)
+    h.update((version or code_version()).encode('utf-8'))
+    if options:
+        h.update(repr(sorted(options.items())).encode('utf-8'))
+    return h.hexdigest()
+
+
+class OverlapCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + '.npz')
+
+    # Return the dict of arrays stored under key, or None
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                arrays = {name: data[name] for name in data.files}
+        except (IOError, OSError, ValueError):
+            # missing, or removed / truncated by another process
+            return None
+        # the modification time orders the entries for eviction
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return arrays
+
+    # Store a dict of arrays under key.  The file is written to a temporary name first,
+    # so other processes never read a partial entry.
+    def put(self, key, arrays):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez_compressed(f, **{name: np.asarray(a) for name, a in arrays.items()})
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.evict()
+
+    # Remove the least recently used entries until the cache fits in max_bytes
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.npz'):
+                try:
+                    st = os.stat(os.path.join(self.cache_dir, name))
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, name))
+        total = sum(e[1] for e in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.npz'):
+                os.remove(os.path.join(self.cache_dir, name))
+
+
+# The cache configured by the environment variables, or None when it is not set up
+def get_default_cache():
+    cache_dir = os.environ.get(CACHE_DIR_ENV)
+    if not cache_dir:
+        return None
+    max_mb = os.environ.get(CACHE_SIZE_ENV)
+    return OverlapCache(cache_dir, DEFAULT_MAX_BYTES if max_mb is None else int(float(max_mb) * (1 << 20)))
+
+
+# Return the raw overlaps of a layout, computing them with compute() (returning a dict of arrays)
+# only if they are not in the cache.  Without a cache, compute() is always called.
+def cached_overlaps(layout_path, compute, cache=None, options=None):
+    if cache is None:
+        cache = get_default_cache()
+    if cache is None:
+        return compute()
+
+    key = layout_key(layout_path, options=options)
+    arrays = cache.get(key)
+    if arrays is None:
+        arrays = compute()
+        cache.put(key, arrays)
+    return arrays
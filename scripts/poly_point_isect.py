@@ -10,11 +10,25 @@ __all__ = (
     "isect_segments_include_segments",
     "isect_polygon_include_segments",
 
+    # same as above but as NumPy arrays of the points and the indices of the intersecting segment pairs
+    "isect_segments_include_indices",
+    # same as above but a generator of '(point, i, j)', using bounded memory
+    "isect_segments_iter",
+    # only the number of intersecting pairs (optionally by level)
+    "isect_segments_count",
+
+    # switch the number type (see NUMBER_TYPE)
+    "set_number_type",
+
     # for testing only (correct but slow)
     "isect_segments__naive",
     "isect_polygon__naive",
     )
 
+import heapq
+import os
+from itertools import islice
+
 # ----------------------------------------------------------------------------
 # Main Poly Intersection
 
@@ -47,39 +61,100 @@ X, Y = 0, 1
 # -----------------------------------------------------------------------------
 # Switchable Number Implementation
 
-NUMBER_TYPE = 'numpy'
-
-if NUMBER_TYPE == 'native':
-    Real = float
-    NUM_EPS = Real("1e-10")
-    NUM_INF = Real(float("inf"))
-elif NUMBER_TYPE == 'decimal':
-    # Not passing tests!
-    import decimal
-    Real = decimal.Decimal
-    decimal.getcontext().prec = 80
-    NUM_EPS = Real("1e-10")
-    NUM_INF = Real(float("inf"))
-elif NUMBER_TYPE == 'numpy':
+# The number type can be changed with the POLY_POINT_ISECT_NUMBER_TYPE environment variable,
+# or by calling set_number_type() before any computation (this changes it for the whole process).
+# The IEEE double types can also be chosen per call with the 'number_type' argument of the isect_* functions,
+# which only changes how the input coordinates are converted, no global state is switched,
+# so calls with different number types can run in other threads or interleave (see ``isect_segments_iter``).
+#
+# - 'numpy': numpy.float64 scalars (the default).
+# - 'native': plain Python floats, several times faster in the sweep loop.
+#   Both are IEEE doubles, so the results are the same.
+
+NUMBER_TYPE = None
+
+# The number types that can be chosen per call.
+# They share the same plain float constants, so the arithmetic follows the type of the coordinates.
+IEEE_NUMBER_TYPES = ('native', 'numpy')
+
+
+def set_number_type(number_type):
+    global NUMBER_TYPE, Real, NUM_EPS, NUM_INF, NUM_EPS_SQ, NUM_ZERO, NUM_ONE
+
+    if number_type == 'native':
+        Real = float
+    elif number_type == 'decimal':
+        # Not passing tests!
+        import decimal
+        Real = decimal.Decimal
+        decimal.getcontext().prec = 80
+        NUM_EPS = Real("1e-10")
+        NUM_INF = Real(float("inf"))
+    elif number_type == 'numpy':
+        import numpy
+        Real = numpy.float64
+        del numpy
+    elif number_type == 'gmpy2':
+        # Not passing tests!
+        import gmpy2
+        gmpy2.set_context(gmpy2.ieee(128))
+        Real = gmpy2.mpz
+        NUM_EPS = Real(float("1e-10"))
+        NUM_INF = gmpy2.get_emax_max()
+        del gmpy2
+    else:
+        raise Exception("Type not found")
+
+    if number_type in IEEE_NUMBER_TYPES:
+        # numpy.float64 has the same precision as a native float,
+        # a smaller epsilon breaks the comparison of nearly equal y-intercepts in Event.Compare.
+        NUM_EPS = 1e-10
+        NUM_INF = float("inf")
+        NUM_ZERO = 0.0
+        NUM_ONE = 1.0
+    else:
+        NUM_ZERO = Real(0.0)
+        NUM_ONE = Real(1.0)
+    NUM_EPS_SQ = NUM_EPS * NUM_EPS
+    NUMBER_TYPE = number_type
+
+
+set_number_type(os.environ.get('POLY_POINT_ISECT_NUMBER_TYPE', 'numpy'))
+
+
+def real_type(number_type=None):
+    """
+    Return the type converting the input coordinates for a call with ``number_type``
+    (None for the module number type).
+    """
+    if number_type is None or number_type == NUMBER_TYPE:
+        return Real
+    if number_type not in IEEE_NUMBER_TYPES or NUMBER_TYPE not in IEEE_NUMBER_TYPES:
+        raise ValueError("number_type %r can't be chosen per call with the number type %r, "
+                         "use set_number_type()" % (number_type, NUMBER_TYPE))
+    if number_type == 'native':
+        return float
     import numpy
-    Real = numpy.float64
-    del numpy
-    NUM_EPS = Real("1e-18")
-    NUM_INF = Real(float("inf"))
-elif NUMBER_TYPE == 'gmpy2':
-    # Not passing tests!
-    import gmpy2
-    gmpy2.set_context(gmpy2.ieee(128))
-    Real = gmpy2.mpz
-    NUM_EPS = Real(float("1e-10"))
-    NUM_INF = gmpy2.get_emax_max()
-    del gmpy2
-else:
-    raise Exception("Type not found")
-
-NUM_EPS_SQ = NUM_EPS * NUM_EPS
-NUM_ZERO = Real(0.0)
-NUM_ONE = Real(1.0)
+    return numpy.float64
+
+
+def segments_sorted(segments, real):
+    """
+    Order the points of every segment left -> right,
+    and always convert to tuples of ``real`` (even for native floats, the input may be lists or ints).
+    """
+    return [
+        # in nearly all cases, comparing X is enough,
+        # but compare Y too for vertical lines
+        (
+            (real(s[0][0]), real(s[0][1])),
+            (real(s[1][0]), real(s[1][1])),
+        ) if (tuple(s[0]) <= tuple(s[1])) else
+        (
+            (real(s[1][0]), real(s[1][1])),
+            (real(s[0][0]), real(s[0][1])),
+        )
+        for s in segments]
 
 
 class Event:
@@ -87,11 +162,18 @@ class Event:
         "type",
         "point",
         "segment",
+        # the index of the segment in the input, None for INTERSECTION
+        "index",
 
         # this is just cache,
         # we may remove or calculate slope on the fly
         "slope",
         "span",
+
+        # cache of the last ``y_intercept_x`` result,
+        # only recomputed when the sweep line moves
+        "_y_intercept_x",
+        "_y_intercept",
         ) + (() if not USE_DEBUG else (
          # debugging only
         "other",
@@ -105,16 +187,18 @@ class Event:
         if USE_VERTICAL:
             START_VERTICAL = 3
 
-    def __init__(self, type, point, segment, slope):
+    def __init__(self, type, point, segment, slope, index=None):
         assert(isinstance(point, tuple))
         self.type = type
         self.point = point
         self.segment = segment
+        self.index = index
 
         # will be None for INTERSECTION
         self.slope = slope
         if segment is not None:
             self.span = segment[1][X] - segment[0][X]
+        self._y_intercept_x = None
 
         if USE_DEBUG:
             self.other = None
@@ -132,10 +216,18 @@ class Event:
     def y_intercept_x(self, x: Real):
         # vertical events only for comparison (above_all check)
         # never added into the binary-tree its self
+        if x == self._y_intercept_x:
+            return self._y_intercept
+
         if USE_VERTICAL:
             if self.is_vertical():
                 return None
 
+        self._y_intercept_x = x
+        self._y_intercept = y = self._y_intercept_x_impl(x)
+        return y
+
+    def _y_intercept_x_impl(self, x: Real):
         if x <= self.segment[0][X]:
             return self.segment[0][Y]
         elif x >= self.segment[1][X]:
@@ -226,20 +318,44 @@ class SweepLine:
         "_current_event_point_x",
         # A flag to indicate if we're slightly before or after the line.
         "_before",
+
+        # Streaming mode, see ``pop_intersection_pairs``:
+        # intersections are removed from ``intersections`` once the sweep is past them.
+        "_streaming",
+        # The points removed at the current sweep X, mapped to their Events,
+        # so Events found later at the same point only add their new pairs.
+        # {Point: set(Event, ...), ...}
+        "_retired",
+        # With ``dedupe``: the pairs reported so far, by the index of the segment ending first (removed at its END),
+        # so a pair found again behind the sweep line isn't reported twice.  A pair is kept while both of its
+        # segments cross the sweep line, so this can hold most of the pairs when many long segments cross.
+        # {index: set(index, ...), ...}, or None without ``dedupe``.
+        "_reported",
+        # The '(point, i, j)' pairs found after their point was removed, see ``pop_late_pairs``.
+        "_late",
+
+        # The type of the coordinates, see ``real_type``.
+        "_real",
         )
 
-    def __init__(self):
+    def __init__(self, status_type='rbtree', streaming=False, real=None, dedupe=False):
         self.intersections = {}
+        self._real = Real if real is None else real
 
         self._current_event_point_x = None
-        self._events_current_sweep = RBTree(cmp=Event.Compare, cmp_data=self)
+        self._events_current_sweep = SWEEP_STATUS_TYPES[status_type](cmp=Event.Compare, cmp_data=self)
         self._before = True
 
+        self._streaming = streaming
+        self._retired = {}
+        self._reported = {} if dedupe else None
+        self._late = []
+
     def get_intersections(self):
         """
         Return a list of unordered intersection points.
         """
-        if Real is float:
+        if self._real is float:
             return list(self.intersections.keys())
         else:
             return [(float(p[0]), float(p[1])) for p in self.intersections.keys()]
@@ -250,7 +366,7 @@ class SweepLine:
         Return a list of unordered intersection '(point, segment)' pairs,
         where segments may contain 2 or more values.
         """
-        if Real is float:
+        if self._real is float:
             return [
                 (p, [event.segment for event in event_set])
                 for p, event_set in self.intersections.items()
@@ -266,6 +382,85 @@ class SweepLine:
                 for p, event_set in self.intersections.items()
             ]
 
+    def get_intersection_arrays(self):
+        """
+        Return the intersections as NumPy arrays ``(points, i, j)``:
+        the (K,2) intersection points and the indices of the two input segments, ``i < j``,
+        with one row per intersecting segment pair.
+        """
+        import numpy as np
+        xy = []
+        first = []
+        second = []
+        for p, event_set in self.intersections.items():
+            indices = sorted(event.index for event in event_set)
+            for a in range(len(indices) - 1):
+                for b in range(a + 1, len(indices)):
+                    xy.append(p)
+                    first.append(indices[a])
+                    second.append(indices[b])
+        return (np.array(xy, dtype=float).reshape(-1, 2),
+                np.array(first, dtype=np.int64),
+                np.array(second, dtype=np.int64))
+
+    def pop_intersection_pairs(self, p):
+        """
+        Remove the intersection at point ``p`` (if any) once the sweep is done with it,
+        and return a list of its '(point, i, j)' segment index pairs, ``i < j``.
+        """
+        event_set = self.intersections.pop(p, None)
+        if event_set is None:
+            return []
+        self._retired[p] = event_set
+        events = sorted(event_set, key=lambda e: e.index)
+        return [
+            self._report(p, events[a], events[b])
+            for a in range(len(events) - 1)
+            for b in range(a + 1, len(events))
+        ]
+
+    def pop_late_pairs(self):
+        """
+        Return, and forget, the '(point, i, j)' pairs found since the last call at a point already removed
+        by ``pop_intersection_pairs`` at the current sweep X, or with ``dedupe``, behind the sweep line.
+        Together with ``pop_intersection_pairs``, every pair of ``get_intersection_arrays`` is returned once,
+        except that without ``dedupe`` the pairs first found behind the sweep line (which only happens with
+        degenerate input) are left out.
+        """
+        late = self._late
+        self._late = []
+        return late
+
+    def _report(self, p, a: Event, b: Event):
+        if a.index > b.index:
+            a, b = b, a
+        if self._reported is not None:
+            # only remember the pair while both segments can be checked again
+            first, other = (a, b) if a.segment[1][X] <= b.segment[1][X] else (b, a)
+            if first.type != Event.Type.START_VERTICAL:
+                self._reported.setdefault(first.index, set()).add(other.index)
+        if self._real is not float:
+            p = (float(p[0]), float(p[1]))
+        return p, a.index, b.index
+
+    def _is_reported(self, a: Event, b: Event):
+        return (b.index in self._reported.get(a.index, ()) or
+                a.index in self._reported.get(b.index, ()))
+
+    # In streaming mode, report the pairs of an intersection found after its point was removed.
+    # Without dedupe, a pair behind the sweep line at an older X is taken as found again and skipped:
+    # with input in general position every pair is found before the sweep line reaches its point.
+    def _check_late_intersection(self, p, a: Event, b: Event):
+        event_set = self._retired.get(p)
+        if event_set is not None:
+            # the new Events form pairs with all the Events at this point, as in ``get_intersection_arrays``
+            for e in (a, b):
+                if e not in event_set:
+                    self._late.extend(self._report(p, e, other) for other in event_set)
+                    event_set.add(e)
+        elif self._reported is not None and not self._is_reported(a, b):
+            self._late.append(self._report(p, a, b))
+
     # Checks if an intersection exists between two Events 'a' and 'b'.
     def _check_intersection(self, a: Event, b: Event):
         # Return immediately in case either of the events is null, or
@@ -299,6 +494,12 @@ class SweepLine:
 
                 return
 
+        # In streaming mode, intersections behind the sweep line were already popped.
+        if self._streaming:
+            if p[X] < self._current_event_point_x or p in self._retired:
+                self._check_late_intersection(p, a, b)
+                return
+
         # Add the intersection.
         events_for_point = self.intersections.pop(p, set())
         is_new = len(events_for_point) == 0
@@ -320,6 +521,7 @@ class SweepLine:
             return
 
         self._current_event_point_x = p[X]
+        self._retired.clear()
 
     def insert(self, event):
         # assert(event not in self._events_current_sweep)
@@ -407,7 +609,9 @@ class SweepLine:
             e_above = self.above(event)
             e_below = self.below(event)
 
-            self.remove(event)
+            # with degenerate input the event may not be found, then it can still be checked
+            if self.remove(event) and self._reported is not None:
+                self._reported.pop(event.index, None)
 
             self._check_intersection(e_above, e_below)
             if USE_PARANOID:
@@ -473,6 +677,118 @@ class SweepLine:
             # self.remove(event)
 
 
+class SweepStatusOrderError(Exception):
+    """
+    Raised by ``SweepStatusList`` when the order of its events no longer agrees with the comparison.
+    """
+
+
+class SweepStatusList:
+    """
+    Array-backed alternative to the ``RBTree`` holding the events of the current sweep.
+
+    Events are kept in a plain sorted list, found with a binary search using the same comparison
+    as the tree, so neighbours are found by index and insertion/removal is a single list memmove
+    instead of a rebalancing.
+
+    With degenerate input (shared end-points, collinear overlaps, intersection points a rounding error apart)
+    the events can stop being sorted by the comparison at the current sweep position.  The tree and the list
+    then look in different places and find different neighbours, so instead of guessing, the list raises
+    ``SweepStatusOrderError`` as soon as a look-up or an insertion disagrees with the order of its events,
+    and the sweep is run again with the tree (see ``isect_segments_impl``).
+    """
+    __slots__ = (
+        "_keys",
+        "_cmp",
+        "_cmp_data",
+        # index of the last key looked up,
+        # the sweep line queries the neighbours of an event right after inserting it
+        "_hint",
+        )
+
+    def __init__(self, cmp, cmp_data):
+        self._keys = []
+        self._cmp = cmp
+        self._cmp_data = cmp_data
+        self._hint = 0
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _bisect_left(self, key):
+        keys = self._keys
+        cmp = self._cmp
+        cmp_data = self._cmp_data
+        lo = 0
+        hi = len(keys)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if cmp(cmp_data, keys[mid], key) < 0:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _index(self, key):
+        """
+        Return the index of ``key``, or -1 when it isn't found.
+        """
+        keys = self._keys
+        cmp = self._cmp
+        cmp_data = self._cmp_data
+        i = self._hint
+        # the hint is only taken where the binary search would find it too
+        if i < len(keys) and keys[i] is key and \
+                (i == 0 or cmp(cmp_data, keys[i - 1], key) < 0) and \
+                (i + 1 == len(keys) or cmp(cmp_data, key, keys[i + 1]) < 0):
+            return i
+        i = self._bisect_left(key)
+        if i < len(keys) and cmp(cmp_data, key, keys[i]) == 0:
+            self._hint = i
+            return i
+        # not where the comparison puts it, but an event of its segment is still there
+        segment = key.segment
+        if any(k.segment == segment for k in keys):
+            raise SweepStatusOrderError()
+        return -1
+
+    def insert(self, key, value):
+        # the value is unused, this only stores keys
+        keys = self._keys
+        cmp = self._cmp
+        cmp_data = self._cmp_data
+        i = self._bisect_left(key)
+        self._hint = i
+        if i < len(keys) and cmp(cmp_data, key, keys[i]) == 0:
+            return
+        if (i > 0 and cmp(cmp_data, keys[i - 1], key) >= 0) or (i < len(keys) and cmp(cmp_data, key, keys[i]) >= 0):
+            raise SweepStatusOrderError()
+        keys.insert(i, key)
+
+    def remove(self, key):
+        i = self._index(key)
+        if i == -1:
+            raise KeyError(str(key))
+        del self._keys[i]
+
+    def succ_key(self, key, default=None):
+        i = self._index(key)
+        if i == -1 or i + 1 == len(self._keys):
+            return default
+        return self._keys[i + 1]
+
+    def prev_key(self, key, default=None):
+        i = self._index(key)
+        if i <= 0:
+            return default
+        return self._keys[i - 1]
+
+    def key_slice(self, start_key, end_key, reverse=False):
+        # only used for the open-ended (end_key=None), ascending slice of SweepLine.above_all
+        assert(end_key is None and not reverse)
+        return islice(self._keys, self._bisect_left(start_key), None)
+
+
 class EventQueue:
     __slots__ = (
         # note: we only ever pop_min, this could use a 'heap' structure.
@@ -483,9 +799,16 @@ class EventQueue:
 
     def __init__(self, segments, line: SweepLine):
         self.events_scan = RBTree()
+        self._offer_segments(segments)
+        line.queue = self
+
+    def __len__(self):
+        return len(self.events_scan)
+
+    def _offer_segments(self, segments):
         # segments = [s for s in segments if s[0][0] != s[1][0] and s[0][1] != s[1][1]]
 
-        for s in segments:
+        for index, s in enumerate(segments):
             assert(s[0][X] <= s[1][X])
 
             slope = slope_v2v2(*s)
@@ -493,15 +816,15 @@ class EventQueue:
             if s[0] == s[1]:
                 pass
             elif USE_VERTICAL and (s[0][X] == s[1][X]):
-                e_start = Event(Event.Type.START_VERTICAL, s[0], s, slope)
+                e_start = Event(Event.Type.START_VERTICAL, s[0], s, slope, index)
 
                 if USE_DEBUG:
                     e_start.other = e_start  # FAKE, avoid error checking
 
                 self.offer(s[0], e_start)
             else:
-                e_start = Event(Event.Type.START, s[0], s, slope)
-                e_end   = Event(Event.Type.END,   s[1], s, slope)
+                e_start = Event(Event.Type.START, s[0], s, slope, index)
+                e_end   = Event(Event.Type.END,   s[1], s, slope, index)
 
                 if USE_DEBUG:
                     e_start.other = e_end
@@ -510,8 +833,6 @@ class EventQueue:
                 self.offer(s[0], e_start)
                 self.offer(s[1], e_end)
 
-        line.queue = self
-
     def offer(self, p, e: Event):
         """
         Offer a new event ``s`` at point ``p`` in this queue.
@@ -542,69 +863,598 @@ class EventQueue:
         return p, events_current
 
 
-def isect_segments_impl(segments, include_segments=False) -> list:
-    # order points left -> right
-    if Real is float:
-        segments = [
-            # in nearly all cases, comparing X is enough,
-            # but compare Y too for vertical lines
-            (s[0], s[1]) if (s[0] <= s[1]) else
-            (s[1], s[0])
-            for s in segments]
-    else:
-        segments = [
-            # in nearly all cases, comparing X is enough,
-            # but compare Y too for vertical lines
-            (
-                (Real(s[0][0]), Real(s[0][1])),
-                (Real(s[1][0]), Real(s[1][1])),
-            ) if (s[0] <= s[1]) else
-            (
-                (Real(s[1][0]), Real(s[1][1])),
-                (Real(s[0][0]), Real(s[0][1])),
-            )
-            for s in segments]
-
-    sweep_line = SweepLine()
-    queue = EventQueue(segments, sweep_line)
-
-    while len(queue.events_scan) > 0:
+class HeapEventQueue(EventQueue):
+    """
+    Same as ``EventQueue``, but since we only ever pop_min,
+    keep the points in a binary heap and merge the events at the same point in a dict.
+    """
+    __slots__ = (
+        # The points of ``events_scan``, ordered as a heap
+        "points_heap",
+        )
+
+    def __init__(self, segments, line: SweepLine):
+        # [Point: Event] (dict)
+        self.events_scan = {}
+        self.points_heap = []
+        self._offer_segments(segments)
+        line.queue = self
+
+    def offer(self, p, e: Event):
+        """
+        Offer a new event ``s`` at point ``p`` in this queue.
+        """
+        existing = self.events_scan.get(p)
+        if existing is None:
+            existing = ([], [], [], []) if USE_VERTICAL else ([], [], [])
+            self.events_scan[p] = existing
+            heapq.heappush(self.points_heap, p)
+
+        existing[e.type].append(e)
+
+    def poll(self):
+        """
+        Get, and remove, the first (lowest) item from this queue.
+
+        :return: the first (lowest) item from this queue.
+        :rtype: Point, Event pair.
+        """
+        assert(len(self.events_scan) != 0)
+        p = heapq.heappop(self.points_heap)
+        return p, self.events_scan.pop(p)
+
+
+SWEEP_STATUS_TYPES = {
+    'rbtree': lambda cmp, cmp_data: RBTree(cmp=cmp, cmp_data=cmp_data),
+    'list': SweepStatusList,
+}
+
+EVENT_QUEUE_TYPES = {
+    'rbtree': EventQueue,
+    'heap': HeapEventQueue,
+}
+
+
+def _sweep(segments, queue_type, status_type, real):
+    sweep_line = SweepLine(status_type=status_type, real=real)
+    queue = EVENT_QUEUE_TYPES[queue_type](segments, sweep_line)
+
+    while len(queue) > 0:
         if USE_VERBOSE:
-            print(len(queue.events_scan), sweep_line._current_event_point_x)
+            print(len(queue), sweep_line._current_event_point_x)
         p, e_ls = queue.poll()
         for events_current in e_ls:
             if events_current:
                 sweep_line._sweep_to(p)
                 sweep_line.handle(p, events_current)
+    return sweep_line
 
-    if include_segments is False:
+
+def isect_segments_impl(segments, output='points', queue_type='heap', status_type='rbtree',
+                        number_type=None) -> list:
+    """
+    The Bentley-Ottmann sweep-line, with the events of the current sweep in a ``status_type`` structure
+    (a key of ``SWEEP_STATUS_TYPES``).  When the 'list' finds its events out of order the sweep is run again
+    with the 'rbtree', so both give the same intersections.
+    """
+    real = real_type(number_type)
+    segments = segments_sorted(segments, real)
+
+    try:
+        sweep_line = _sweep(segments, queue_type, status_type, real)
+    except SweepStatusOrderError:
+        sweep_line = _sweep(segments, queue_type, 'rbtree', real)
+
+    if output == 'points':
         return sweep_line.get_intersections()
-    else:
+    elif output == 'segments':
         return sweep_line.get_intersections_with_segments()
+    elif output == 'indices':
+        return sweep_line.get_intersection_arrays()
+    else:
+        raise Exception("Output not found")
+
 
+def isect_segments_iter_impl(segments, queue_type='heap', status_type='rbtree', number_type=None, dedupe=False):
+    """
+    Same as ``isect_segments_impl``, but yield each intersecting segment pair as '(point, i, j)'
+    (with the indices ``i < j`` of the two segments) as soon as the sweep line is past its point.
+
+    Only the intersections ahead of the sweep line (and those at its current X) are held in memory.
+    A pair found again behind the sweep line is skipped.
+
+    With input in general position the pairs are the same as ``isect_segments_include_indices``.
+    With degenerate input (collinear overlaps, shared points) the sweep-line may find a pair for the first time
+    behind the sweep line, which is left out unless ``dedupe`` is true.  With ``dedupe``, the reported pairs of
+    the segments still crossing the sweep line are also kept, to tell such a pair from one found again.
+    They are a large part of all the pairs when many long segments cross the sweep line, e.g. up to 25093 of
+    the 111520 pairs of 1000 random segments.  Even then, a pair first found at a point behind the sweep line is
+    reported alone, not with the other segments the point had when it was removed.
+
+    As in ``isect_segments_impl``, the 'list' status falls back on the 'rbtree' when it finds its events
+    out of order: the sweep starts again with the tree, past the pairs already yielded.
+    """
+    real = real_type(number_type)
+    segments = segments_sorted(segments, real)
+
+    if status_type == 'rbtree':
+        yield from _sweep_iter(segments, queue_type, status_type, real, dedupe)
+        return
+    count = 0
+    try:
+        for item in _sweep_iter(segments, queue_type, status_type, real, dedupe):
+            yield item
+            count += 1
+    except SweepStatusOrderError:
+        yield from islice(_sweep_iter(segments, queue_type, 'rbtree', real, dedupe), count, None)
 
-def isect_polygon_impl(points, include_segments=False) -> list:
+
+def _sweep_iter(segments, queue_type, status_type, real, dedupe):
+    sweep_line = SweepLine(status_type=status_type, streaming=True, real=real, dedupe=dedupe)
+    queue = EVENT_QUEUE_TYPES[queue_type](segments, sweep_line)
+
+    while len(queue) > 0:
+        p, e_ls = queue.poll()
+        for events_current in e_ls:
+            if events_current:
+                sweep_line._sweep_to(p)
+                sweep_line.handle(p, events_current)
+        # all the events at this point are handled, nothing can be added to its intersection,
+        # unless handling them queued a new intersection event at this same point
+        if p not in queue.events_scan:
+            yield from sweep_line.pop_intersection_pairs(p)
+        yield from sweep_line.pop_late_pairs()
+
+    # every intersection ahead of the sweep line has an event, so this should be empty
+    for p in list(sweep_line.intersections.keys()):
+        yield from sweep_line.pop_intersection_pairs(p)
+    yield from sweep_line.pop_late_pairs()
+
+
+def isect_polygon_impl(points, output='points', **kwargs) -> list:
     n = len(points)
     segments = [
         (tuple(points[i]), tuple(points[(i + 1) % n]))
         for i in range(n)]
-    return isect_segments_impl(segments, include_segments=include_segments)
+    return isect_segments_engine_impl(segments, output=output, **kwargs)
+
+
+def isect_segments_engine_impl(segments, output='points', engine='sweep', **kwargs) -> list:
+    """
+    Find the intersections with the given engine, as:
+
+    - 'points': a list of points.
+    - 'segments': a list of '(point, segments)' pairs.
+    - 'indices': a tuple of NumPy arrays ``(points, i, j)``, see ``SweepLine.get_intersection_arrays``.
+
+    The engine is one of:
+
+    - 'sweep': the Bentley-Ottmann sweep-line (``isect_segments_impl``).
+    - 'grid': the uniform grid (``isect_segments_grid_impl``).
+    - 'tiled': vertical slabs in parallel processes (``isect_segments_tiled_impl``).
+    - 'auto': pick one from the number of segments.
+    """
+    if engine == 'auto':
+        engine = 'grid' if len(segments) >= GRID_ENGINE_MIN_SEGMENTS else 'sweep'
+    kwargs = engine_options(engine, kwargs)
+    return ISECT_ENGINES[engine](segments, output=output, **kwargs)
+
+
+def isect_segments(segments, **kwargs) -> list:
+    return isect_segments_engine_impl(segments, output='points', **kwargs)
+
+
+def isect_polygon(segments, **kwargs) -> list:
+    return isect_polygon_impl(segments, output='points', **kwargs)
+
 
+def isect_segments_include_segments(segments, **kwargs) -> list:
+    return isect_segments_engine_impl(segments, output='segments', **kwargs)
 
-def isect_segments(segments) -> list:
-    return isect_segments_impl(segments, include_segments=False)
 
+def isect_polygon_include_segments(segments, **kwargs) -> list:
+    return isect_polygon_impl(segments, output='segments', **kwargs)
 
-def isect_polygon(segments) -> list:
-    return isect_polygon_impl(segments, include_segments=False)
 
+def isect_segments_include_indices(segments, **kwargs) -> tuple:
+    return isect_segments_engine_impl(segments, output='indices', **kwargs)
 
-def isect_segments_include_segments(segments) -> list:
-    return isect_segments_impl(segments, include_segments=True)
 
+def isect_segments_iter(segments, **kwargs):
+    return isect_segments_iter_impl(segments, **kwargs)
 
-def isect_polygon_include_segments(segments) -> list:
-    return isect_polygon_impl(segments, include_segments=True)
+
+def isect_segments_count(segments, levels=None, num_levels=None, engine='sweep', dedupe=False, **kwargs):
+    """
+    Count the intersecting segment pairs, without keeping the intersections.
+
+    :param levels: optional level label (an int) of each segment,
+        to also count the pairs by level.
+    :param num_levels: the number of levels, defaults to the largest label + 1.
+    :param dedupe: for the 'sweep' engine, see ``isect_segments_iter_impl``.
+    :return: the number of pairs, or when ``levels`` is given, a tuple of the number of pairs
+        and a (num_levels, num_levels) NumPy array of the number of pairs by level,
+        counted in the upper triangle (row <= column).
+    """
+    import numpy as np
+    if levels is not None:
+        levels = np.asarray(levels, dtype=np.int64)
+        if num_levels is None:
+            num_levels = int(levels.max()) + 1 if len(levels) > 0 else 0
+        count_by_level = np.zeros((num_levels, num_levels), dtype=np.int64)
+
+    if engine == 'sweep':
+        # streaming, so only the intersections ahead of the sweep line are kept
+        kwargs = dict(engine_options('sweep', kwargs), dedupe=dedupe)
+        if levels is None:
+            return sum(1 for _ in isect_segments_iter_impl(segments, **kwargs))
+        levels_list = levels.tolist()
+        count_by_level_list = count_by_level.tolist()
+        count = 0
+        for _, i, j in isect_segments_iter_impl(segments, **kwargs):
+            level_i = levels_list[i]
+            level_j = levels_list[j]
+            if level_i > level_j:
+                level_i, level_j = level_j, level_i
+            count_by_level_list[level_i][level_j] += 1
+            count += 1
+        return count, np.array(count_by_level_list, dtype=np.int64).reshape(num_levels, num_levels)
+
+    _, i, j = isect_segments_engine_impl(segments, output='indices', engine=engine, **kwargs)
+    if levels is None:
+        return len(i)
+    level_i = np.minimum(levels[i], levels[j])
+    level_j = np.maximum(levels[i], levels[j])
+    np.add.at(count_by_level, (level_i, level_j), 1)
+    return len(i), count_by_level
+
+
+# ----------------------------------------------------------------------------
+# Uniform Grid Intersection
+#
+# An alternative to the sweep-line: the segments are hashed into a uniform grid,
+# and only the pairs sharing a grid cell are tested, all at once with NumPy.
+# For dense layouts of many short edges this is usually faster than the sweep.
+
+# Use the grid engine for 'auto' from this number of segments.
+GRID_ENGINE_MIN_SEGMENTS = 64
+
+# Bound the number of grid cells to this many per segment.
+GRID_MAX_CELLS_PER_SEGMENT = 4
+
+
+def segments_as_array(segments):
+    """
+    Return the segments as an (N,2,2) float array,
+    with points ordered left -> right (Y too for vertical lines) as in the sweep-line.
+    """
+    import numpy as np
+    s = np.array(segments, dtype=float).reshape(-1, 2, 2)
+    swap = ((s[:, 0, X] > s[:, 1, X]) |
+            ((s[:, 0, X] == s[:, 1, X]) & (s[:, 0, Y] > s[:, 1, Y])))
+    s[swap] = s[swap, ::-1]
+    return s
+
+
+def grid_candidate_pairs(s, cell_size=None, bounding_box=None):
+    """
+    Return the index arrays ``(i, j)``, ``i < j``, of the segment pairs of ``s`` (an (N,2,2) array)
+    sharing at least one cell of a uniform grid.
+
+    :param cell_size: the width of a cell, defaults to the median segment length.
+    :param bounding_box: the ``[[x0, y0], [x1, y1]]`` bounding box of the layout,
+        it is enlarged to include all segments if needed.
+    """
+    import numpy as np
+    n = len(s)
+    if n < 2:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    lo = s.min(axis=1)
+    hi = s.max(axis=1)
+    box_min = lo.min(axis=0)
+    box_max = hi.max(axis=0)
+    if bounding_box is not None:
+        bounding_box = np.asarray(bounding_box, dtype=float)
+        box_min = np.minimum(box_min, bounding_box.min(axis=0))
+        box_max = np.maximum(box_max, bounding_box.max(axis=0))
+    extent = box_max - box_min
+
+    if cell_size is None:
+        d = s[:, 1] - s[:, 0]
+        cell_size = float(np.median(np.sqrt(d[:, X] ** 2 + d[:, Y] ** 2)))
+    cell_size = max(cell_size, (extent[X] * extent[Y] / (GRID_MAX_CELLS_PER_SEGMENT * n)) ** 0.5)
+    if cell_size <= 0.0:
+        cell_size = max(float(extent.max()), 1.0)
+    dims = np.maximum(np.ceil(extent / cell_size).astype(np.int64), 1)
+
+    # All cells of the bounding box of each segment, as (segment, cx, cy) entries
+    c_lo = np.clip(np.floor((lo - box_min) / cell_size).astype(np.int64), 0, dims - 1)
+    c_hi = np.clip(np.floor((hi - box_min) / cell_size).astype(np.int64), 0, dims - 1)
+    span = c_hi - c_lo + 1
+    counts = span[:, X] * span[:, Y]
+    seg = np.repeat(np.arange(n), counts)
+    k = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    cx = c_lo[seg, X] + k % span[seg, X]
+    cy = c_lo[seg, Y] + k // span[seg, X]
+
+    # Only keep the cells the segment line passes through:
+    # the distance of the cell centre to the line is within half the cell extent along the line normal.
+    d = s[seg, 1] - s[seg, 0]
+    centre_x = box_min[X] + (cx + 0.5) * cell_size - s[seg, 0, X]
+    centre_y = box_min[Y] + (cy + 0.5) * cell_size - s[seg, 0, Y]
+    dist = np.abs(centre_y * d[:, X] - centre_x * d[:, Y])
+    reach = (np.abs(d[:, X]) + np.abs(d[:, Y])) * (cell_size / 2.0)
+    keep = dist <= reach * (1.0 + 1e-9)
+    seg = seg[keep]
+    cell = cy[keep] * dims[X] + cx[keep]
+
+    # Every pair of entries of the same cell
+    order = np.argsort(cell, kind='stable')
+    cell = cell[order]
+    seg = seg[order]
+    m = len(cell)
+    starts = np.flatnonzero(np.r_[True, cell[1:] != cell[:-1]])
+    ends = np.r_[starts[1:], m]
+    n_after = np.repeat(ends, ends - starts) - np.arange(m) - 1
+    first = np.repeat(np.arange(m), n_after)
+    second = first + 1 + (np.arange(n_after.sum()) - np.repeat(np.cumsum(n_after) - n_after, n_after))
+    a = seg[first]
+    b = seg[second]
+    i = np.minimum(a, b)
+    j = np.maximum(a, b)
+
+    # The same pair may share several cells
+    pair = np.unique(i * n + j)
+    i = pair // n
+    j = pair % n
+
+    # Cheap bounding box rejection before the exact test
+    overlap = ((lo[i, X] <= hi[j, X]) & (lo[j, X] <= hi[i, X]) &
+               (lo[i, Y] <= hi[j, Y]) & (lo[j, Y] <= hi[i, Y]))
+    return i[overlap], j[overlap]
+
+
+def isect_seg_seg_v2_points(s, i, j):
+    """
+    Vectorized ``isect_seg_seg_v2_point`` for the segment pairs ``(s[i], s[j])``,
+    with the ``USE_IGNORE_SEGMENT_ENDINGS`` check of the sweep-line.
+
+    :return: the mask of the intersecting pairs, and the x and y arrays of their intersection points.
+    """
+    import numpy as np
+
+    # Same (v1, v2) <= (v3, v4) order as isect_seg_seg_v2_point,
+    # so the computed points are exactly the same as the sweep-line.
+    a = s[i].reshape(-1, 4)
+    b = s[j].reshape(-1, 4)
+    greater = np.zeros(len(a), dtype=bool)
+    equal = np.ones(len(a), dtype=bool)
+    for c in range(4):
+        greater |= equal & (a[:, c] > b[:, c])
+        equal &= a[:, c] == b[:, c]
+    a, b = np.where(greater[:, None], b, a), np.where(greater[:, None], a, b)
+    v1x, v1y, v2x, v2y = a.T
+    v3x, v3y, v4x, v4y = b.T
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        div = (v2x - v1x) * (v4y - v3y) - (v2y - v1y) * (v4x - v3x)
+        c12 = v1x * v2y - v1y * v2x
+        c34 = v3x * v4y - v3y * v4x
+        x = ((v3x - v4x) * c12 - (v1x - v2x) * c34) / div
+        y = ((v3y - v4y) * c12 - (v1y - v2y) * c34) / div
+
+        def line_point_factor(px, py, l1x, l1y, l2x, l2y):
+            ux = l2x - l1x
+            uy = l2y - l1y
+            hx = px - l1x
+            hy = py - l1y
+            dot = (ux * ux) + (uy * uy)
+            return np.where(dot != 0.0, ((ux * hx) + (uy * hy)) / dot, -1.0)
+
+        fac1 = line_point_factor(x, y, v1x, v1y, v2x, v2y)
+        fac2 = line_point_factor(x, y, v3x, v3y, v4x, v4y)
+        mask = ((div != 0.0) &
+                (fac1 >= 0.0) & (fac1 <= 1.0) &
+                (fac2 >= 0.0) & (fac2 <= 1.0))
+
+    if USE_IGNORE_SEGMENT_ENDINGS:
+        eps_sq = float(NUM_EPS_SQ)
+
+        def near_ends(t):
+            return ((((x - s[t, 0, X]) ** 2 + (y - s[t, 0, Y]) ** 2) < eps_sq) |
+                    (((x - s[t, 1, X]) ** 2 + (y - s[t, 1, Y]) ** 2) < eps_sq))
+
+        mask &= ~(near_ends(i) & near_ends(j))
+
+    return mask, x, y
+
+
+def isect_segments_grid_impl(segments, output='points', cell_size=None, bounding_box=None,
+                             number_type=None) -> list:
+    """
+    Same as ``isect_segments_impl``, using a uniform grid instead of the sweep-line.
+    The exact test is done on NumPy float64 arrays whatever the (IEEE double) number type.
+    """
+    import numpy as np
+    real_type(number_type)
+    s = segments_as_array(segments)
+    # zero length segments are ignored, as in the sweep-line
+    valid = np.flatnonzero(np.any(s[:, 0] != s[:, 1], axis=1))
+    i, j = grid_candidate_pairs(s[valid], cell_size=cell_size, bounding_box=bounding_box)
+    i = valid[i]
+    j = valid[j]
+    mask, x, y = isect_seg_seg_v2_points(s, i, j)
+
+    if output == 'indices':
+        return np.stack((x[mask], y[mask]), axis=1), i[mask], j[mask]
+
+    points = list(zip(x[mask].tolist(), y[mask].tolist()))
+    if output == 'points':
+        return list(dict.fromkeys(points))
+
+    # {Point: {segment index: None, ...}, ...}
+    intersections = {}
+    for p, a, b in zip(points, i[mask].tolist(), j[mask].tolist()):
+        segment_set = intersections.setdefault(p, {})
+        segment_set[a] = None
+        segment_set[b] = None
+    s = s.tolist()
+    return [
+        (p, [(tuple(s[k][0]), tuple(s[k][1])) for k in segment_set])
+        for p, segment_set in intersections.items()
+    ]
+
+
+# ----------------------------------------------------------------------------
+# Parallel Tiled Intersection
+#
+# The layout is cut into vertical slabs, and each slab is handled by another engine
+# in a worker process.  The segments are clipped to their slab (plus a small margin),
+# so the work of a slab only depends on the part of the layout inside it.
+# The clipped segments only tell which pairs intersect: the points are computed again
+# from the original segments with the same arithmetic as the sweep-line,
+# and a slab only keeps the points whose X is inside it, so none are reported twice.
+# As in the grid engine, every pair is tested on its own: with degenerate input (collinear overlaps),
+# the pairs of segments meeting at the point of another pair are not added as the sweep-line does.
+
+# Margin added on both sides of a slab, relative to the X extent of the layout,
+# so the crossings on a slab boundary are inside the clipped segments of both slabs.
+TILED_SLAB_MARGIN = 1e-9
+
+
+def clip_segments_x(s, x_min, x_max):
+    """
+    Return a copy of the segments ``s`` (an (N,2,2) array ordered left -> right) clipped to ``x_min <= X <= x_max``.
+    The segments must overlap this range, vertical segments are unchanged.
+    """
+    import numpy as np
+    clipped = s.copy()
+    d = s[:, 1] - s[:, 0]
+    left = s[:, 0, X] < x_min
+    t = (x_min - s[left, 0, X]) / d[left, X]
+    clipped[left, 0] = s[left, 0] + t[:, None] * d[left]
+    clipped[left, 0, X] = x_min
+    right = s[:, 1, X] > x_max
+    t = (x_max - s[right, 0, X]) / d[right, X]
+    clipped[right, 1] = s[right, 0] + t[:, None] * d[right]
+    clipped[right, 1, X] = x_max
+    return clipped
+
+
+def _isect_segments_slab(s, x_min, x_max, is_last, margin, kwargs):
+    """
+    Return the intersections of the segments ``s`` (original coordinates) with X in the slab
+    as ``(x, y, i, j)`` arrays, the indices are in ``s``.
+    """
+    clipped = clip_segments_x(s, x_min - margin, x_max + margin)
+    _, i, j = isect_segments_engine_impl(clipped.tolist(), output='indices', **kwargs)
+    mask, x, y = isect_seg_seg_v2_points(s, i, j)
+    keep = mask & (x_min <= x) & ((x < x_max) | is_last)
+    return x[keep], y[keep], i[keep], j[keep]
+
+
+def isect_segments_tiled_impl(segments, output='points', workers=None, slabs=None,
+                              slab_engine='sweep', **kwargs) -> list:
+    """
+    Same as ``isect_segments_impl``, running ``slab_engine`` over vertical slabs in parallel.
+
+    :param workers: the number of worker processes, defaults to the number of CPUs.
+    :param slabs: the number of slabs, defaults to ``workers``.
+        Slab boundaries are quantiles of the segment end points, so each slab gets a similar number of segments.
+    """
+    import numpy as np
+    from concurrent.futures import ProcessPoolExecutor
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if slabs is None:
+        slabs = workers
+    # workers may run with another default number type (spawn start method)
+    kwargs.setdefault('number_type', NUMBER_TYPE)
+    kwargs['engine'] = slab_engine
+
+    s = segments_as_array(segments)
+    # zero length segments are ignored, as in the sweep-line
+    valid = np.flatnonzero(np.any(s[:, 0] != s[:, 1], axis=1))
+    x0 = s[valid, 0, X]
+    x1 = s[valid, 1, X]
+    bounds = np.unique(np.quantile(np.concatenate((x0, x1)), np.linspace(0.0, 1.0, slabs + 1))
+                       if len(valid) > 0 else np.zeros(1))
+    if len(bounds) < 2:
+        bounds = np.array([bounds[0], bounds[0]])
+    margin = TILED_SLAB_MARGIN * max(float(bounds[-1] - bounds[0]), 1.0)
+
+    slab_indices = []
+    tasks = []
+    for k in range(len(bounds) - 1):
+        is_last = k == len(bounds) - 2
+        in_slab = valid[(x0 <= bounds[k + 1] + margin) & (x1 >= bounds[k] - margin)]
+        slab_indices.append(in_slab)
+        tasks.append((s[in_slab], float(bounds[k]), float(bounds[k + 1]), is_last, margin))
+
+    if workers <= 1 or len(tasks) == 1:
+        results = [_isect_segments_slab(*t, kwargs) for t in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_isect_segments_slab, *t, kwargs) for t in tasks]
+            results = [f.result() for f in futures]
+
+    # map the indices in the slabs back to the input
+    x = np.concatenate([r[0] for r in results])
+    y = np.concatenate([r[1] for r in results])
+    i = np.concatenate([in_slab[r[2]] for in_slab, r in zip(slab_indices, results)])
+    j = np.concatenate([in_slab[r[3]] for in_slab, r in zip(slab_indices, results)])
+    if output == 'indices':
+        return np.stack((x, y), axis=1), i, j
+
+    points = list(zip(x.tolist(), y.tolist()))
+    if output == 'points':
+        return list(dict.fromkeys(points))
+
+    # {Point: {segment index: None, ...}, ...}
+    intersections = {}
+    for p, a, b in zip(points, i.tolist(), j.tolist()):
+        segment_set = intersections.setdefault(p, {})
+        segment_set[a] = None
+        segment_set[b] = None
+    s = s.tolist()
+    return [
+        (p, [(tuple(s[k][0]), tuple(s[k][1])) for k in segment_set])
+        for p, segment_set in intersections.items()
+    ]
+
+
+ISECT_ENGINES = {
+    'sweep': isect_segments_impl,
+    'grid': isect_segments_grid_impl,
+    'tiled': isect_segments_tiled_impl,
+}
+
+# The options of every engine
+_SWEEP_OPTIONS = ('queue_type', 'status_type', 'number_type')
+_GRID_OPTIONS = ('cell_size', 'bounding_box', 'number_type')
+ENGINE_OPTIONS = {
+    'sweep': _SWEEP_OPTIONS,
+    'grid': _GRID_OPTIONS,
+    # the other options are given to the slab engine
+    'tiled': ('workers', 'slabs', 'slab_engine') + _SWEEP_OPTIONS + _GRID_OPTIONS,
+}
+
+
+def engine_options(engine, options):
+    """
+    Return the ``options`` used by ``engine``.
+    The options of the other engines are left out, so a caller can switch the engine alone,
+    but options of no engine are an error.
+    """
+    if engine not in ENGINE_OPTIONS:
+        raise ValueError("Engine %r not found, expected one of: %s" % (
+            engine, ", ".join(["auto"] + list(ENGINE_OPTIONS))))
+    unknown = set(options).difference(*ENGINE_OPTIONS.values())
+    if unknown:
+        raise TypeError("Unknown option(s) for the intersection engines: %s" % ", ".join(sorted(unknown)))
+    return {k: v for k, v in options.items() if k in ENGINE_OPTIONS[engine]}
 
 
 # ----------------------------------------------------------------------------
@@ -638,14 +1488,18 @@ def len_squared_v2v2(a, b):
     return dot_v2v2(c, c)
 
 
-def line_point_factor_v2(p, l1, l2, default=NUM_ZERO):
+def line_point_factor_v2(p, l1, l2, default=None):
+    if default is None:
+        default = NUM_ZERO
     u = sub_v2v2(l2, l1)
     h = sub_v2v2(p, l1)
     dot = dot_v2v2(u, u)
     return (dot_v2v2(u, h) / dot) if dot != NUM_ZERO else default
 
 
-def isect_seg_seg_v2_point(v1, v2, v3, v4, bias=NUM_ZERO):
+def isect_seg_seg_v2_point(v1, v2, v3, v4, bias=None):
+    if bias is None:
+        bias = NUM_ZERO
     # Only for predictability and hashable point when same input is given
     if v1 > v2:
         v1, v2 = v2, v1
@@ -683,29 +1537,14 @@ def isect_seg_seg_v2_point(v1, v2, v3, v4, bias=NUM_ZERO):
 # Simple naive line intersect, (for testing only)
 
 
-def isect_segments__naive(segments) -> list:
+def isect_segments__naive(segments, number_type=None) -> list:
     """
     Brute force O(n2) version of ``isect_segments`` for test validation.
     """
     isect = []
 
     # order points left -> right
-    if Real is float:
-        segments = [
-            (s[0], s[1]) if s[0][X] <= s[1][X] else
-            (s[1], s[0])
-            for s in segments]
-    else:
-        segments = [
-            (
-                (Real(s[0][0]), Real(s[0][1])),
-                (Real(s[1][0]), Real(s[1][1])),
-            ) if (s[0] <= s[1]) else
-            (
-                (Real(s[1][0]), Real(s[1][1])),
-                (Real(s[0][0]), Real(s[0][1])),
-            )
-            for s in segments]
+    segments = segments_sorted(segments, real_type(number_type))
 
     n = len(segments)
 
@@ -722,7 +1561,7 @@ def isect_segments__naive(segments) -> list:
     return isect
 
 
-def isect_polygon__naive(points) -> list:
+def isect_polygon__naive(points, number_type=None) -> list:
     """
     Brute force O(n2) version of ``isect_polygon`` for test validation.
     """
@@ -730,11 +1569,8 @@ def isect_polygon__naive(points) -> list:
 
     n = len(points)
 
-    if Real is float:
-        pass
-    else:
-        points = [(Real(p[0]), Real(p[1])) for p in points]
-
+    real = real_type(number_type)
+    points = [(real(p[0]), real(p[1])) for p in points]
 
     for i in range(n):
         a0, a1 = points[i], points[(i + 1) % n]
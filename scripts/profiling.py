@@ -0,0 +1,109 @@
+# coding: utf-8
+
+# Per-stage instrumentation of a metric run: wall time, CPU time, memory and pair counts of every stage,
+# e.g. json load, geometry construction, index build, candidate generation, exact geometry, penalty mapping,
+# level breakdown and result write.
+#
+#   profiler = StageProfiler()
+#   with profiler.stage('candidates') as s:
+#       i, j = geometric.get_candidate_pairs(bounds)
+#       s['pairs'] = len(i)
+#   result['profile'] = profiler.as_dict()
+#
+# The memory of a stage is max_rss_so_far: the peak resident set size of the process from its start until the end
+# of the stage (ru_maxrss), not the memory used by the stage itself.  It only grows, so a stage that raises it is
+# the first one to need that much memory.
+
+from contextlib import contextmanager
+import cProfile
+import os
+import pstats
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+
+# Peak resident set size of this process since it started, in bytes, or None if unknown
+def max_rss_so_far():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+STAGE_FIELDS = ('stage', 'wall_time', 'cpu_time', 'max_rss_so_far')
+
+
+class StageProfiler:
+    def __init__(self):
+        self.stages = []
+
+    # Record the stage run in the with block.  The yielded dict takes the counts of the stage (e.g. pairs).
+    # A stage run several times (e.g. in an update) is accumulated under the same name.
+    @contextmanager
+    def stage(self, name):
+        counts = {}
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield counts
+        finally:
+            self.add(name, time.perf_counter() - wall, time.process_time() - cpu, counts)
+
+    # Record a stage timed by the caller
+    def add(self, name, wall, cpu, counts=None):
+        counts = counts or {}
+        for s in self.stages:
+            if s['stage'] == name:
+                s['wall_time'] += wall
+                s['cpu_time'] += cpu
+                s['max_rss_so_far'] = max_rss_so_far()
+                for k, v in counts.items():
+                    s[k] = s.get(k, 0) + v
+                return
+        self.stages.append(dict(counts, stage=name, wall_time=wall, cpu_time=cpu, max_rss_so_far=max_rss_so_far()))
+
+    # Add the stages of another profiler to this one
+    def merge(self, other):
+        for s in other.stages:
+            counts = {k: v for k, v in s.items() if k not in STAGE_FIELDS}
+            self.add(s['stage'], s['wall_time'], s['cpu_time'], counts)
+
+    def reset(self):
+        self.stages = []
+
+    # The stages in the order they first ran, for the result json
+    def as_dict(self):
+        return [dict(s) for s in self.stages]
+
+    def report(self, file=None):
+        file = file or sys.stdout
+        for s in self.stages:
+            counts = ' '.join('{}={}'.format(k, v) for k, v in s.items() if k not in STAGE_FIELDS)
+            rss = '' if s['max_rss_so_far'] is None else '{:.0f}MB'.format(s['max_rss_so_far'] / 1e6)
+            file.write('    {:<24} wall {:8.3f}s cpu {:8.3f}s max rss {:>8} {}\n'.format(
+                s['stage'], s['wall_time'], s['cpu_time'], rss, counts))
+
+
+# Run func(*args, **kwargs) under cProfile and dump the stats to path (read them with pstats, print_profile or
+# snakeviz).  Return the result of func.
+def run_profiled(path, func, *args, **kwargs):
+    profile = cProfile.Profile()
+    try:
+        return profile.runcall(func, *args, **kwargs)
+    finally:
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        profile.dump_stats(path)
+
+
+# Print the top functions by cumulative time of the stats dumped by run_profiled
+def print_profile(path, top=20, file=None):
+    pstats.Stats(path, stream=file or sys.stdout).sort_stats('cumulative').print_stats(top)
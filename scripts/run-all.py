@@ -1,7 +1,17 @@
 # coding: utf-8
 
 from sc_metrics import run_store_print
+import layout
+import metrics_pass
+import overlap_cache
+import profiling
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import argparse
+import itertools
+import json
+import os
+import time
+import traceback
 
 parser = argparse.ArgumentParser()
 parser.add_argument('--data_dir', required=True)
@@ -10,16 +20,35 @@ parser.add_argument('--alpha_nn', default=0.2, type=float)
 parser.add_argument('--alpha_ne', default=0.2, type=float)
 parser.add_argument('--alpha_ee', default=0.2, type=float)
 parser.add_argument('--ee', choices=['linear', 'quadratic'], default='linear')
+parser.add_argument('--area_penalty', choices=['power', 'linear'], default='power',
+                    help='sweep mode: NN penalty function of the overlap area')
 parser.add_argument('--skip_nn_computation', default=False, action='store_true')
 parser.add_argument('--skip_ne_computation', default=False, action='store_true')
 parser.add_argument('--skip_ee_computation', default=False, action='store_true')
 parser.add_argument('--skip_area_computation', default=False, action='store_true')
 parser.add_argument('--skip_Dunne_metrics', default=False, action='store_true')
 parser.add_argument('--skip_level_breakdown', default=False, action='store_true')
-parser.add_argument('--debug', default=False, action='store_true')
-
-args = parser.parse_args()
-print(args)
+parser.add_argument('--debug', default=False, action='store_true', help='print the stages of every layout')
+parser.add_argument('--overlap_cache', default=None,
+                    help='sweep mode: directory of the on-disk cache of raw overlaps, reused when a layout is unchanged')
+parser.add_argument('--overlap_cache_mb', default=1024, type=float,
+                    help='size limit of the overlap cache, least recently used entries are removed beyond it')
+parser.add_argument('--workers', default=1, type=int,
+                    help='number of layouts computed at the same time in separate processes')
+# alphas are kept as given on the command line for the output directory names, e.g. 0.20
+parser.add_argument('--sweep_alpha', default=None, nargs='+',
+                    help='sweep mode: alphas used for alpha_nn, alpha_ne and alpha_ee at the same time')
+parser.add_argument('--sweep_ee', default=None, choices=['linear', 'quadratic'], nargs='+',
+                    help='sweep mode: EE angle penalty function types')
+parser.add_argument('--sweep_output_pattern', default='param-ee-{ee}-{alpha}',
+                    help='sweep mode: sub-directory of output_dir for each parameter combination')
+parser.add_argument('--profile', default=False, action='store_true',
+                    help='run each layout under cProfile (<profile_dir>/<layout>.prof) and write the wall time, '
+                         'CPU time, max RSS and pair counts of its stages to <profile_dir>/<layout>_profile.json')
+parser.add_argument('--profile_dir', default='./profiles',
+                    help='directory of the --profile outputs, kept apart from the result files')
+parser.add_argument('--profile_print', default=0, type=int,
+                    help='with --profile, print the top N functions by cumulative time of every layout')
 
 files = [
          'four-clusters-original',
@@ -121,21 +150,156 @@ files = [
 #          'four-clusters-ee0']
 
 
-for f in files:
-    run_store_print(args.data_dir,
-                    f,
-                    output_dir=args.output_dir,
-                    # area_penalty_func_type='power',
-                    # length_penalty_func_type='linear',
-                    angle_penalty_func_type=args.ee,
-                    alpha_nn=args.alpha_nn,
-                    alpha_ne=args.alpha_ne,
-                    alpha_ee=args.alpha_ee,
-                    skip_nn_computation=args.skip_nn_computation,
-                    skip_ne_computation=args.skip_ne_computation,
-                    skip_ee_computation=args.skip_ee_computation,
-                    skip_area_computation=args.skip_area_computation,
-                    skip_Dunne_metrics=args.skip_Dunne_metrics,
-                    skip_level_breakdown=args.skip_level_breakdown,
-                    debug=args.debug)
 
+# The parameter combinations of a run: a single one from --alpha_* and --ee,
+# or the product of --sweep_alpha and --sweep_ee, each written to its own sub-directory of output_dir
+def parameter_combinations(args):
+    if args.sweep_alpha is None and args.sweep_ee is None:
+        return [{'output_dir': args.output_dir, 'angle_penalty_func_type': args.ee,
+                 'alpha_nn': args.alpha_nn, 'alpha_ne': args.alpha_ne, 'alpha_ee': args.alpha_ee}]
+
+    combinations = []
+    for ee, alpha in itertools.product(args.sweep_ee or [args.ee], args.sweep_alpha or [args.alpha_ee]):
+        output_dir = os.path.join(args.output_dir, args.sweep_output_pattern.format(ee=ee, alpha=alpha))
+        combinations.append({'output_dir': output_dir, 'angle_penalty_func_type': ee,
+                             'alpha_nn': float(alpha), 'alpha_ne': float(alpha), 'alpha_ee': float(alpha)})
+    return combinations
+
+
+def profile_path(args, f):
+    return os.path.join(args.profile_dir, f + '.prof')
+
+
+def write_profile(profiler, profile_dir, f):
+    with open(os.path.join(profile_dir, f + '_profile.json'), 'w') as out:
+        json.dump({'name': f, 'stages': profiler.as_dict()}, out, indent=2)
+
+
+def is_sweep(args):
+    return args.sweep_alpha is not None or args.sweep_ee is not None
+
+
+# Compute the metrics of one layout with run_store_print, once per parameter combination
+def store_layout(data_dir, f, args, combinations, profiler):
+    for params in combinations:
+        with profiler.stage('run_store_print'):
+            run_store_print(data_dir,
+                            f,
+                            # area_penalty_func_type='power',
+                            # length_penalty_func_type='linear',
+                            skip_nn_computation=args.skip_nn_computation,
+                            skip_ne_computation=args.skip_ne_computation,
+                            skip_ee_computation=args.skip_ee_computation,
+                            skip_area_computation=args.skip_area_computation,
+                            skip_Dunne_metrics=args.skip_Dunne_metrics,
+                            skip_level_breakdown=args.skip_level_breakdown,
+                            debug=args.debug,
+                            **params)
+
+
+# Sweep mode: compute the metrics of one layout for every parameter combination.  The overlaps are computed once
+# (metrics_pass.layout_overlaps), then only the penalty mapping and the breakdowns are evaluated per combination.
+# So a layout is handled by a single worker for the whole parameter study.
+# metrics_pass is not checked against sc_metrics yet, so the other runs still use run_store_print (store_layout).
+# Every result json gets the 'profile' of its stages: those of the overlaps, shared by all the combinations
+# (load, geometry, index, candidates, exact_geometry), then those of its own combination (metrics, dunne).
+def compute_layout(data_dir, f, args, combinations, profiler):
+    families = [family for family in metrics_pass.FAMILIES if not getattr(args, 'skip_{}_computation'.format(family))]
+    overlaps = metrics_pass.layout_overlaps(layout.find_layout(data_dir, f), families=families,
+                                            count_only=args.skip_area_computation, profiler=profiler)
+    overlap_stages = profiler.as_dict()
+    for params in combinations:
+        parameters = {k: v for k, v in params.items() if k != 'output_dir'}
+        parameters.update(area_penalty_func_type=args.area_penalty,
+                          skip_nn_computation=args.skip_nn_computation,
+                          skip_ne_computation=args.skip_ne_computation,
+                          skip_ee_computation=args.skip_ee_computation,
+                          skip_area_computation=args.skip_area_computation,
+                          skip_Dunne_metrics=args.skip_Dunne_metrics,
+                          skip_level_breakdown=args.skip_level_breakdown)
+        stages = profiling.StageProfiler()
+        result = metrics_pass.evaluate(f, overlaps, parameters, stages)
+        result['profile'] = overlap_stages + stages.as_dict()
+        with stages.stage('result_write'):
+            metrics_pass.write_result(result, params['output_dir'])
+        profiler.merge(stages)
+
+
+# Run compute_layout (sweep mode) or store_layout under cProfile with --profile, return the wall time of the layout.
+# The profile is only printed by the main process (print_layout_profile), so the outputs of workers do not mix.
+def run_layout(data_dir, f, args, combinations=None):
+    start = time.time()
+    combinations = combinations or parameter_combinations(args)
+    profiler = profiling.StageProfiler()
+    compute = compute_layout if is_sweep(args) else store_layout
+    if args.profile:
+        profiling.run_profiled(profile_path(args, f), compute, data_dir, f, args, combinations, profiler)
+        write_profile(profiler, args.profile_dir, f)
+    else:
+        compute(data_dir, f, args, combinations, profiler)
+    if args.debug:
+        print(f)
+        profiler.report()
+    return time.time() - start
+
+
+def print_layout_profile(args, f):
+    if args.profile and args.profile_print > 0:
+        profiling.print_profile(profile_path(args, f), args.profile_print)
+
+
+# Estimate the cost of a layout by the number of nodes and edges in its json file (output of tlp2myjson)
+def layout_size(data_dir, f):
+    try:
+        layout = json.load(open(os.path.join(data_dir, f + '.json')))
+    except (IOError, ValueError):
+        return 0
+    return len(layout.get('leaf_nodes', [])) + len(layout.get('metanodes', {})) + len(layout.get('edges', []))
+
+
+# Run the layouts in a process pool, largest first so that the slowest layouts do not start last,
+# and report each layout as soon as it finishes.  Return the layouts that failed.
+def run_parallel(files, args):
+    sizes = {f: layout_size(args.data_dir, f) for f in files}
+    ordered = sorted(files, key=lambda f: sizes[f], reverse=True)
+    failed = []
+    start = time.time()
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        combinations = parameter_combinations(args)
+        futures = {executor.submit(run_layout, args.data_dir, f, args, combinations): f for f in ordered}
+        for i, future in enumerate(as_completed(futures)):
+            f = futures[future]
+            try:
+                seconds = future.result()
+                print('[{}/{}] {} (size: {}) done in {:.1f}s, elapsed {:.1f}s'
+                      .format(i + 1, len(files), f, sizes[f], seconds, time.time() - start), flush=True)
+                print_layout_profile(args, f)
+            except Exception:
+                failed.append(f)
+                print('[{}/{}] {} failed:'.format(i + 1, len(files), f), flush=True)
+                traceback.print_exc()
+    return failed
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    print(args)
+
+    # Set through the environment so that the worker processes use the same cache
+    if args.overlap_cache:
+        os.environ[overlap_cache.CACHE_DIR_ENV] = args.overlap_cache
+        os.environ[overlap_cache.CACHE_SIZE_ENV] = str(args.overlap_cache_mb)
+
+    for params in parameter_combinations(args):
+        if not os.path.isdir(params['output_dir']):
+            os.makedirs(params['output_dir'])
+
+    if args.workers > 1:
+        failed = run_parallel(files, args)
+        if failed:
+            print('Failed layouts:', ', '.join(failed))
+    else:
+        combinations = parameter_combinations(args)
+        for f in files:
+            print('{} done in {:.1f}s'.format(f, run_layout(args.data_dir, f, args, combinations)), flush=True)
+            print_layout_profile(args, f)
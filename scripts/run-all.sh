@@ -42,13 +42,32 @@ run_alpha_ee_linear()
 }
 export -f run_alpha_ee_linear
 
-#  The final run using the chosen parameter
+# The three parameter studies above in one run-all.py call per study, each layout handled once for all alphas
+run_param_sweep()
+{
+    results_dir=../comparative-analysis/static/data
+    python run-all.py --data_dir=../../data/ALL --output_dir=$results_dir --workers=4 \
+        --skip_Dunne_metrics --skip_ee_computation \
+        --sweep_ee quadratic --sweep_alpha 0.01 0.2 0.4 0.6 0.8 0.99 \
+        --sweep_output_pattern='param-nn-ne-{alpha}' > ./logs/param-nn-ne.log
+    python run-all.py --data_dir=../../data/ALL --output_dir=$results_dir --workers=4 \
+        --skip_Dunne_metrics --skip_nn_computation --skip_ne_computation \
+        --sweep_ee quadratic --sweep_alpha 0.01 0.07 0.13 0.20 0.26 0.328 > ./logs/param-ee-quadratic.log
+    python run-all.py --data_dir=../../data/ALL --output_dir=$results_dir --workers=4 \
+        --skip_Dunne_metrics --skip_nn_computation --skip_ne_computation \
+        --sweep_ee linear --sweep_alpha 0.01 0.13 0.26 0.39 0.52 0.637 > ./logs/param-ee-linear.log
+}
+export -f run_param_sweep
+
+#  The final run using the chosen parameter, and the count-only baseline it is compared with
+#  Their execution times are compared in the analysis, so every layout runs alone: one worker, and the runs below
+#  are started one after another
 run_all_metrics()
 {
     results_dir=../comparative-analysis/static/data
     output_dir=$results_dir/all-metrics-$1
     mkdir -p $output_dir
-    python run-all.py --data_dir=../../data/ALL --output_dir=$output_dir \
+    python run-all.py --data_dir=../../data/ALL --output_dir=$output_dir --workers=1 \
         --ee=quadratic --alpha_nn=0.2 --alpha_ne=0.2 --alpha_ee=0.2 > ./logs/all-metrics-$1.log
 }
 export -f run_all_metrics
@@ -58,7 +77,7 @@ run_count_only()
     results_dir=../comparative-analysis/static/data
     output_dir=$results_dir/count-only-$1
     mkdir -p $output_dir
-    python run-all.py --data_dir=../../data/ALL --output_dir=$output_dir \
+    python run-all.py --data_dir=../../data/ALL --output_dir=$output_dir --workers=1 \
         --skip_area_computation \
         --ee=quadratic --alpha_nn=0.2 --alpha_ne=0.2 --alpha_ee=0.2 > ./logs/count-only-$1.log
 }
@@ -67,7 +86,8 @@ export -f run_count_only
 #parallel --jobs 3 run_alpha_nn ::: 0.01 0.2 0.4 0.6 0.8 0.99
 #parallel --jobs 3 run_alpha_ee_quad ::: 0.01 0.07 0.13 0.20 0.26 0.328
 #parallel --jobs 2 run_alpha_ee_linear ::: 0.01 0.13 0.26 0.39 0.52 0.637
+# run_param_sweep
 
-# parallel --jobs 3 run_all_metrics ::: 2 3 4
-parallel --jobs 2 run_count_only ::: 1 2 3 4
+# parallel --jobs 1 run_all_metrics ::: 2 3 4
+parallel --jobs 1 run_count_only ::: 1 2 3 4
 
@@ -0,0 +1,89 @@
+# coding: utf-8
+
+# Checks of the Dunne ratios against layouts small enough to work out by hand.
+# Run with: python -m unittest test_dunne (from this directory)
+
+import json
+import math
+import os
+import tempfile
+import unittest
+
+from shapely.geometry import LineString, box, mapping
+
+import dunne
+import incremental
+import metrics_pass
+
+
+def _square_leaf(i, x, y, side=1.0):
+    return {'id': i, 'parent_metanode': None, 'diameter': side,
+            'geometry': mapping(box(x - side / 2.0, y - side / 2.0, x + side / 2.0, y + side / 2.0))}
+
+
+def _edge(i, ends, a, b):
+    return {'id': i, 'ends': ends, 'geometry': mapping(LineString([a, b]))}
+
+
+# Two unit squares overlapping by half their area, and two edges crossing at a right angle far from them
+def _layout():
+    leaf_nodes = [_square_leaf(0, 0, 0), _square_leaf(1, 0.5, 0),
+                  _square_leaf(2, -10, 20), _square_leaf(3, 10, 20), _square_leaf(4, 0, 10), _square_leaf(5, 0, 30)]
+    edges = [_edge(0, [2, 3], (-9.5, 20), (9.5, 20)), _edge(1, [4, 5], (0, 10.5), (0, 29.5))]
+    return leaf_nodes, edges
+
+
+class TestDunneRatios(unittest.TestCase):
+    def test_node_occlusion(self):
+        self.assertEqual(dunne.node_occlusion_ratio([], [1.0, 1.0]), 1.0)
+        self.assertAlmostEqual(dunne.node_occlusion_ratio([0.5], [1.0, 1.0]), 0.75)
+        # two identical nodes
+        self.assertAlmostEqual(dunne.node_occlusion_ratio([1.0], [1.0, 1.0]), 0.5)
+        # three identical nodes: the pairwise areas add up to more than the total area
+        self.assertEqual(dunne.node_occlusion_ratio([1.0, 1.0, 1.0], [1.0, 1.0, 1.0]), 0.0)
+
+    def test_crossing_angle(self):
+        self.assertEqual(dunne.crossing_angle_ratio([]), 1.0)
+        self.assertAlmostEqual(dunne.crossing_angle_ratio([math.radians(70)]), 1.0)
+        self.assertAlmostEqual(dunne.crossing_angle_ratio([math.pi / 2]), 1 - 20 / 70.0)
+        self.assertAlmostEqual(dunne.crossing_angle_ratio([math.radians(35), math.radians(70)]), 0.75)
+
+    def test_shared_pass(self):
+        leaf_nodes, edges = _layout()
+        metrics = incremental.IncrementalMetrics(leaf_nodes, [], edges)
+        result = metrics_pass.evaluate('squares', metrics_pass.overlap_arrays(metrics))['metrics']
+        # overlap 0.5 of a total node area of 6
+        self.assertAlmostEqual(result['nn']['dunne_ratio'], 1 - 0.5 / 6)
+        self.assertAlmostEqual(result['ee']['dunne_ratio'], 1 - 20 / 70.0)
+        self.assertEqual(result['nn']['total_count'], 1)
+        self.assertEqual(result['ee']['total_count'], 1)
+
+        incremental_result = metrics.result(dunne=True)
+        for family in ['nn', 'ee']:
+            self.assertAlmostEqual(incremental_result[family]['dunne_ratio'], result[family]['dunne_ratio'])
+
+    def test_count_only(self):
+        leaf_nodes, edges = _layout()
+        metrics = incremental.IncrementalMetrics(leaf_nodes, [], edges, count_only=True)
+        result = metrics_pass.evaluate('squares', metrics_pass.overlap_arrays(metrics))['metrics']
+        self.assertNotIn('dunne_ratio', result['nn'])
+        self.assertAlmostEqual(result['ee']['dunne_ratio'], 1 - 20 / 70.0)
+
+    def test_counted_crossings(self):
+        # a count-only pass over a layout file counts the crossings without their angles
+        leaf_nodes, edges = _layout()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'squares.json')
+            with open(path, 'w') as f:
+                json.dump({'leaf_nodes': leaf_nodes, 'metanodes': {}, 'edges': edges}, f)
+            overlaps = metrics_pass.layout_overlaps(path, count_only=True)
+        self.assertEqual(overlaps['ee_count_by_level'].tolist(), [[1]])
+        result = metrics_pass.evaluate('squares', overlaps)['metrics']
+        self.assertEqual(result['ee']['total_count'], 1)
+        self.assertEqual(result['ee']['total_penalty'], 1.0)
+        self.assertNotIn('dunne_ratio', result['ee'])
+        self.assertEqual(result['nn']['total_count'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+# coding: utf-8
+
+# Checks of the closed-form and batch geometry of geometric.py against Shapely and exact values on small hand-made
+# cases.
+# Run with: python -m unittest test_geometric (from this directory)
+
+import math
+import random
+import unittest
+
+import numpy as np
+from shapely.geometry import LineString, Point, mapping
+
+import geometric
+import incremental
+
+# Shapely circles with enough segments that their areas and lengths are within 1e-4 of the exact ones
+QUAD_SEGS = 512
+
+
+def _circle(x, y, r):
+    return Point(x, y).buffer(r, quad_segs=QUAD_SEGS)
+
+
+class TestAngles(unittest.TestCase):
+    def test_angles_between_line_segments(self):
+        l1 = [[(0, 0), (2, 0)], [(0, 0), (1, 0)], [(0, 0), (1, 0)], [(1, 1), (3, 3)], [(0, 0), (1, 0)]]
+        # perpendicular, 45 degrees, 60 degrees (reversed), parallel, 120 degrees (so 60)
+        l2 = [[(1, -1), (1, 1)], [(0, 0), (1, 1)], [(0.5, math.sqrt(3) / 2), (0, 0)], [(0, 1), (2, 3)],
+              [(0, 0), (-1, math.sqrt(3))]]
+        angles = geometric.get_angles_between_line_segments(l1, l2)
+        expected = [math.pi / 2, math.pi / 4, math.pi / 3, 0.0, math.pi / 3]
+        for k in range(len(l1)):
+            self.assertAlmostEqual(angles[k], expected[k])
+            self.assertAlmostEqual(angles[k], geometric.get_angle_between_line_segments_v2(l1[k], l2[k]))
+            self.assertAlmostEqual(angles[k], geometric.get_angle_between_line_segments(LineString(l1[k]),
+                                                                                        LineString(l2[k])))
+
+
+def _pair_set(i, j):
+    return set(zip(i.tolist(), j.tolist()))
+
+
+class TestCandidatePairs(unittest.TestCase):
+    def test_hand_made(self):
+        # overlapping, touching at a corner, apart, and a box inside another
+        bounds = [(0, 0, 2, 2), (1, 1, 3, 3), (3, 3, 4, 4), (10, 10, 11, 11), (10.2, 10.2, 10.5, 10.5)]
+        self.assertEqual(_pair_set(*geometric.get_candidate_pairs(bounds)), {(0, 1), (1, 2), (3, 4)})
+        other = [(2, -1, 5, 0), (20, 20, 21, 21)]
+        self.assertEqual(_pair_set(*geometric.get_candidate_pairs(bounds, other)), {(0, 0)})
+
+    @unittest.skipUnless(geometric.SHAPELY_VECTORIZED, 'the strtree method needs Shapely 2.x')
+    def test_sweep_same_as_strtree(self):
+        rng = random.Random(0)
+
+        def boxes(n, size):
+            result = []
+            for _ in range(n):
+                x, y = rng.uniform(0, 100), rng.uniform(0, 100)
+                result.append((x, y, x + rng.uniform(0, size), y + rng.uniform(0, size)))
+            return result
+
+        a, b = boxes(500, 5), boxes(300, 20)
+        for bounds_b in [None, b]:
+            sweep = _pair_set(*geometric.get_candidate_pairs(a, bounds_b, method='sweep'))
+            strtree = _pair_set(*geometric.get_candidate_pairs(a, bounds_b, method='strtree'))
+            self.assertGreater(len(sweep), 0)
+            self.assertEqual(sweep, strtree)
+
+
+class TestCircles(unittest.TestCase):
+    def test_circle_overlap_areas(self):
+        # crossing, touching, apart, one inside the other, equal
+        c1 = [(0, 0), (0, 0), (0, 0), (0, 0), (1, 1), (0, 0)]
+        r1 = [1.0, 1.0, 1.0, 3.0, 2.0, 1.5]
+        c2 = [(1.5, 0), (2, 0), (5, 5), (0.5, 0.5), (1, 1), (0.3, 1.1)]
+        r2 = [1.0, 1.0, 1.0, 1.0, 2.0, 0.7]
+        areas = geometric.get_circle_overlap_areas(c1, r1, c2, r2)
+        for k in range(len(c1)):
+            expected = _circle(*(c1[k] + (r1[k],))).intersection(_circle(*(c2[k] + (r2[k],)))).area
+            self.assertAlmostEqual(areas[k], expected, delta=1e-4 * max(expected, 1))
+        self.assertEqual(areas[2], 0.0)
+        self.assertAlmostEqual(areas[3], np.pi)
+
+    def test_circle_segment_overlap_lengths(self):
+        c = [(0, 0), (0, 0), (0, 0), (0, 0), (0, 0)]
+        r = [1.0, 1.0, 1.0, 2.0, 1.0]
+        # through the center, half inside, outside, inside, a point
+        segments = [[(-2, 0), (2, 0)], [(0, 0.5), (3, 0.5)], [(-2, 2), (2, 2)], [(-1, 0), (1, 0)], [(0, 0), (0, 0)]]
+        lengths = geometric.get_circle_segment_overlap_lengths(c, r, segments)
+        for k in range(len(c)):
+            expected = _circle(c[k][0], c[k][1], r[k]).intersection(LineString(segments[k])).length
+            self.assertAlmostEqual(lengths[k], expected, delta=1e-4)
+        np.testing.assert_allclose(lengths, [2, np.sqrt(0.75), 0, 2, 0], atol=1e-12)
+
+    def test_node_circles(self):
+        nodes = [{'id': 0, 'center': (1, 2), 'diameter': 4, 'geometry': mapping(_circle(1, 2, 2))},
+                 {'id': 1, 'diameter': 2, 'geometry': mapping(_circle(-3, 5, 1))}]
+        centers, radii = geometric.get_node_circles(nodes)
+        np.testing.assert_allclose(centers, [[1, 2], [-3, 5]], atol=1e-12)
+        np.testing.assert_allclose(radii, [2, 1])
+
+    # The NN and NE overlaps of circular leaf nodes in IncrementalMetrics are those of the Shapely circles
+    def test_incremental_circles(self):
+        circles = [(0, 0, 1.0), (1.2, 0.3, 0.8), (-0.5, 1.0, 0.6), (10, 10, 1.0), (14, 10, 1.0)]
+        leaf_nodes = [{'id': k, 'parent_metanode': None, 'center': (x, y), 'diameter': 2 * r,
+                       'geometry': mapping(_circle(x, y, r))} for k, (x, y, r) in enumerate(circles)]
+        edges = [{'id': 0, 'ends': [3, 4], 'geometry': mapping(LineString([(10, 10), (14, 10)]))},
+                 {'id': 1, 'ends': [3, 4], 'geometry': mapping(LineString([(-3, 0.2), (3, -0.4)]))}]
+        metrics = incremental.IncrementalMetrics(leaf_nodes, [], edges)
+        geoms = [_circle(*c) for c in circles]
+        self.assertEqual(sorted(metrics.pairs['nn']), [(0, 1), (0, 2)])
+        for (a, b), (area, _) in metrics.pairs['nn'].items():
+            self.assertAlmostEqual(area, geoms[a].intersection(geoms[b]).area, delta=1e-4)
+        self.assertEqual(sorted(metrics.pairs['ne']), [(0, 1), (1, 1)])
+        for (a, e), (length, _) in metrics.pairs['ne'].items():
+            expected = geoms[a].intersection(LineString(edges[e]['geometry']['coordinates'])).length
+            self.assertAlmostEqual(length, expected, delta=1e-4)
+
+
+if __name__ == '__main__':
+    unittest.main()
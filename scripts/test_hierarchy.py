@@ -0,0 +1,46 @@
+# coding: utf-8
+
+# Checks of the level breakdowns of hierarchy.py on pairs small enough to work out by hand.
+# Run with: python -m unittest test_hierarchy (from this directory)
+
+import unittest
+
+import numpy as np
+
+import hierarchy
+
+
+class TestLevelBreakdown(unittest.TestCase):
+    def test_level_breakdown(self):
+        # the cells (0, 1), (0, 1) (swapped levels), (2, 2) and (1, 2)
+        sums, counts = hierarchy.level_breakdown([0, 1, 2, 1], [1, 0, 2, 2], [1.0, 2.0, 3.0, 4.0], 3)
+        self.assertEqual(sums.tolist(), [[0.0, 3.0, 0.0], [0.0, 0.0, 4.0], [0.0, 0.0, 3.0]])
+        self.assertEqual(counts.tolist(), [[0, 2, 0], [0, 0, 1], [0, 0, 1]])
+
+    def test_no_pairs(self):
+        sums, counts = hierarchy.level_breakdown([], [], [], 2)
+        self.assertEqual(sums.tolist(), [[0.0, 0.0], [0.0, 0.0]])
+        self.assertEqual(counts.tolist(), [[0, 0], [0, 0]])
+
+    def test_pair_levels(self):
+        node_levels = np.array([2, 1, 0])
+        edge_levels = np.array([1, 2, 0])
+        ij = np.array([[0, 1], [2, 0]])
+        self.assertEqual([a.tolist() for a in hierarchy.pair_levels('nn', ij, node_levels, edge_levels)],
+                         [[2, 0], [1, 2]])
+        self.assertEqual([a.tolist() for a in hierarchy.pair_levels('ne', ij, node_levels, edge_levels)],
+                         [[2, 0], [2, 1]])
+        self.assertEqual([a.tolist() for a in hierarchy.pair_levels('ee', ij, node_levels, edge_levels)],
+                         [[1, 0], [2, 1]])
+
+    def test_level_breakdown_json(self):
+        sums, counts = hierarchy.level_breakdown([1], [0], [0.5], 2)
+        self.assertEqual(hierarchy.level_breakdown_json(sums, counts), {
+            'penalty_by_level': [[0.0, 0.5], [0.0, 0.0]],
+            'count_by_level': [[0, 1], [0, 0]],
+            'by_level_mask': [[True, True], [False, True]],
+        })
+
+
+if __name__ == '__main__':
+    unittest.main()
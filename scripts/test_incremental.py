@@ -0,0 +1,65 @@
+# coding: utf-8
+
+# Checks that a failed update of IncrementalMetrics leaves its state unchanged.
+# Run with: python -m unittest test_incremental (from this directory)
+
+import unittest
+
+from shapely.geometry import LineString, Polygon, box, mapping
+
+import incremental
+
+
+def _square_leaf(i, x, y, side=1.0):
+    return {'id': i, 'parent_metanode': None, 'diameter': side,
+            'geometry': mapping(box(x - side / 2.0, y - side / 2.0, x + side / 2.0, y + side / 2.0))}
+
+
+def _edge(i, ends, a, b):
+    return {'id': i, 'ends': ends, 'geometry': mapping(LineString([a, b]))}
+
+
+# Two overlapping unit squares, a third one far away and two crossing edges
+def _metrics():
+    leaf_nodes = [_square_leaf(0, 0, 0), _square_leaf(1, 0.5, 0), _square_leaf(2, 10, 10),
+                  _square_leaf(3, -10, 20), _square_leaf(4, 10, 20), _square_leaf(5, 0, 10), _square_leaf(6, 0, 30)]
+    edges = [_edge(0, [3, 4], (-9.5, 20), (9.5, 20)), _edge(1, [5, 6], (0, 10.5), (0, 29.5))]
+    return incremental.IncrementalMetrics(leaf_nodes, [], edges)
+
+
+def _state(metrics):
+    return ({f: dict(p) for f, p in metrics.pairs.items()},
+            {k: set(v) for k, v in metrics._pairs_of_node.items() if v},
+            {k: set(v) for k, v in metrics._pairs_of_edge.items() if v},
+            list(metrics.node_geoms), list(metrics.nodes), dict(metrics.node_index))
+
+
+class TestFailedUpdate(unittest.TestCase):
+    def test_invalid_geometry(self):
+        metrics = _metrics()
+        before = _state(metrics)
+        self.assertEqual(list(before[0]['nn']), [(0, 1)])
+        bowtie = {'id': 0, 'parent_metanode': None, 'diameter': 1.0,
+                  'geometry': mapping(Polygon([(0, 0), (1, 1), (1, 0), (0, 1)]))}
+        with self.assertRaises(ValueError):
+            metrics.update(nodes=[bowtie])
+        self.assertEqual(_state(metrics), before)
+
+    def test_rollback(self):
+        metrics = _metrics()
+        before = _state(metrics)
+
+        # fails after the pairs of the moved node are dropped
+        def failing_penalty(metrics, i, j, raw):
+            raise RuntimeError('penalty')
+        metrics.penalty_funcs = {'nn': failing_penalty}
+        with self.assertRaises(RuntimeError):
+            metrics.update(nodes=[_square_leaf(2, 0.25, 0), _square_leaf(7, 0, 0.5)])
+        self.assertEqual(_state(metrics), before)
+
+        metrics.penalty_funcs = {}
+        self.assertEqual(metrics.update(nodes=[_square_leaf(2, 0.25, 0)])['nn']['total_count'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+# coding: utf-8
+
+# Cross-checks of the poly_point_isect variants against each other.
+# Run with: python -m unittest test_poly_point_isect (from this directory)
+
+import random
+import unittest
+
+import benchmark_isect
+import poly_point_isect
+
+
+def _index_pairs(xy, i, j):
+    return sorted((tuple(p), a, b) for p, a, b in zip(xy.tolist(), i.tolist(), j.tolist()))
+
+
+def _iter_pairs(segments, **kwargs):
+    return sorted(((float(p[0]), float(p[1])), a, b)
+                  for p, a, b in poly_point_isect.isect_segments_iter(segments, **kwargs))
+
+
+class TestIsectSegmentsIter(unittest.TestCase):
+    def test_same_as_isect_segments(self):
+        for name in ['random', 'short', 'grid']:
+            segments = benchmark_isect.GENERATORS[name](200, random.Random(0))
+            for status_type in ['rbtree', 'list']:
+                expected = _index_pairs(*poly_point_isect.isect_segments_include_indices(
+                    segments, status_type=status_type))
+                pairs = _iter_pairs(segments, status_type=status_type)
+                self.assertEqual(pairs, expected, (name, status_type))
+                self.assertEqual(sorted(set(p for p, _, _ in pairs)),
+                                 sorted(poly_point_isect.isect_segments(segments, status_type=status_type)))
+
+    def test_degenerate_pairs_once(self):
+        # the pairs found behind the sweep line are skipped, or reported only once with dedupe
+        for seed in range(3):
+            segments = benchmark_isect.degenerate_segments(200, random.Random(seed))
+            expected = set(_index_pairs(*poly_point_isect.isect_segments_include_indices(segments)))
+            for dedupe in [False, True]:
+                pairs = _iter_pairs(segments, dedupe=dedupe)
+                self.assertEqual(len(pairs), len(set(pairs)))
+                self.assertLessEqual(set(pairs), expected)
+
+    def test_degenerate_status_types(self):
+        # shared end-points and collinear overlaps, where the events stop being sorted and the list used to
+        # find other neighbours than the tree
+        shared = [((0, 3), (6, 5)), ((2, 1), (10, 0)), ((2, 1), (6, 5)),
+                  ((0.5363295990515825, 7.258344351958147), (2.8617549357457497, 0.10027849702779801)),
+                  ((2, 1), (9, 1)), ((1.0409656816876312, 10.460953077715242), (5.623120628234427, 1.5415322422978524)),
+                  ((2, 1), (8, 7)), ((2, 8), (6, 5)), ((1.0409656816876312, 10.460953077715242), (3, 1))]
+        cases = [shared] + [benchmark_isect.degenerate_segments(100, random.Random(seed)) for seed in range(3)]
+        for segments in cases:
+            expected = _index_pairs(*poly_point_isect.isect_segments_include_indices(segments, status_type='rbtree'))
+            pairs = _index_pairs(*poly_point_isect.isect_segments_include_indices(segments, status_type='list'))
+            self.assertEqual(pairs, expected)
+            self.assertEqual(_iter_pairs(segments, status_type='list'), _iter_pairs(segments, status_type='rbtree'))
+
+    def test_known_count(self):
+        # 9692 crossing pairs, as the naive version; with an epsilon of 1e-18 the numpy sweep found only 542
+        segments = benchmark_isect.random_segments(300, random.Random(0))
+        for number_type in ['native', 'numpy']:
+            self.assertEqual(len(poly_point_isect.isect_segments__naive(segments, number_type=number_type)), 9692)
+            self.assertEqual(poly_point_isect.isect_segments_count(segments, number_type=number_type), 9692)
+            _, i, _ = poly_point_isect.isect_segments_include_indices(segments, number_type=number_type)
+            self.assertEqual(len(i), 9692)
+
+    def test_grid_same_as_naive(self):
+        for name in ['random', 'short', 'grid', 'degenerate']:
+            segments = benchmark_isect.GENERATORS[name](200, random.Random(0))
+            naive = poly_point_isect.isect_segments__naive(segments)
+            xy, i, _ = poly_point_isect.isect_segments_include_indices(segments, engine='grid')
+            self.assertEqual(len(i), len(naive), name)
+            self.assertEqual(set(benchmark_isect._point_key(p) for p in xy.tolist()),
+                             set(benchmark_isect._point_key(p) for p in naive), name)
+
+    def test_interleaved_number_types(self):
+        segments = benchmark_isect.random_segments(100, random.Random(1))
+        expected = _iter_pairs(segments)
+        number_type = poly_point_isect.NUMBER_TYPE
+        native = poly_point_isect.isect_segments_iter(segments, number_type='native')
+        numpy = poly_point_isect.isect_segments_iter(segments, number_type='numpy')
+        pairs_native = []
+        pairs_numpy = []
+        for a, b in zip(native, numpy):
+            self.assertIs(type(a[0][0]), float)
+            pairs_native.append(a)
+            pairs_numpy.append(b)
+        self.assertEqual(sorted(pairs_native), expected)
+        self.assertEqual(sorted(pairs_numpy), expected)
+        self.assertEqual(poly_point_isect.NUMBER_TYPE, number_type)
+
+
+if __name__ == '__main__':
+    unittest.main()